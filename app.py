@@ -1,5 +1,7 @@
 import os
 import datetime
+import time
+import uuid
 
 from dotenv import load_dotenv
 
@@ -14,13 +16,73 @@ from PIL import Image
 from src.chat_ui import text_based
 from src.cucp_reevals import cucp_reevaluations
 from src.foundation_model_chat import foundation_model_chat_ui
-from src.highway_incident_summarizer import summarize_caltrans_incidents
+from src.job_runner import cancel_job, forget_job, get_job, job_key, submit_job
+from src.llm_telemetry import llm_telemetry_ui, set_use_case
+from src.tracing import TRACING_ENABLED, render_trace_panel, span, start_trace
+from src.highway_incident_summarizer import (
+    start_prewarm_poller,
+    summarize_caltrans_incidents,
+)
+
+
+# Optionally keep summaries for the busiest highways warm in the background.
+if os.getenv("CALTRANS_PREWARM_ENABLED", "false").lower() == "true":
+    start_prewarm_poller()
 
 
 def are_all_selected(options_list, selected_fields):
     return all(option in selected_fields for option in options_list)
 
 
+def job_submitter():
+    """Id of this browser session for the shared job runner."""
+    return st.session_state.setdefault("job_submitter", uuid.uuid4().hex)
+
+
+def submit_session_job(key, fn, *args, **kwargs):
+    """submit_job on behalf of this session; identical jobs are shared across sessions."""
+    return submit_job(key, fn, *args, submitter=job_submitter(), **kwargs)
+
+
+@st.fragment(run_every=1.0)
+def job_progress(session_key, job_id, message):
+    """Re-polls a background job every second without rerunning the whole page."""
+    job = get_job(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        st.rerun()
+    elapsed = time.time() - job["submitted_at"]
+    st.info(f"⏳ {message} ({elapsed:.0f}s)")
+    if st.button("Cancel", key=f"cancel_{job_id}"):
+        # Other sessions waiting on the same job keep it running
+        cancel_job(job_id, job_submitter())
+        st.session_state.pop(session_key, None)
+        st.rerun()
+
+
+def collect_job(session_key, message):
+    """
+    Result of the background job whose id is stored under session_key.
+
+    Returns None while the job is still running (a progress box is shown
+    instead), and {"error": ...} if it failed.
+    """
+    job_id = st.session_state.get(session_key)
+    if not job_id:
+        return None
+    job = get_job(job_id)
+    if job is not None and job["status"] in ("queued", "running"):
+        job_progress(session_key, job_id, message)
+        return None
+
+    del st.session_state[session_key]
+    if job is None or job["status"] == "cancelled":
+        return None
+    forget_job(job_id, job_submitter())
+    if job["status"] == "failed":
+        return {"error": job["error"]}
+    return job["result"]
+
+
 # Set up the page layout
 st.set_page_config(page_title="Caltrans", layout="wide")
 
@@ -133,6 +195,7 @@ if vAR_AI_application == "Caltrans":
                 "LLM as a Judge",
                 "LLM Training",
                 "LLM Evaluation",
+                "LLM Telemetry",
                 "Prompt Engineering",
                 "RAG-Document Intelligence",
                 "Personal Narrative Insights",
@@ -151,6 +214,14 @@ else:
 
 # Main Routing
 if app_option != "Select the Usecase":
+    # Every LLM call made during this run is attributed to the selected use case
+    set_use_case(app_option)
+    # Timing spans of this run; the session keeps its last few traced requests
+    trace = start_trace(app_option)
+    if trace is not None:
+        traced_runs = [t for t in st.session_state.get("debug_traces", []) if t["spans"]]
+        st.session_state["debug_traces"] = traced_runs[-9:] + [trace]
+
     # Handle external links - Auto-open in new tab
     if app_option == "Langchain":
         st.markdown(
@@ -381,11 +452,10 @@ if app_option != "Select the Usecase":
             # Auto-consolidate if any level has hit the 45 limit
             any_level_full = any(get_precedent_count(lvl) >= 45 for lvl in [1, 2, 3])
             if any_level_full and not st.session_state.get('_auto_consolidated'):
-                with st.spinner("Auto-consolidating corrections (a level reached its limit)..."):
-                    clean_json_str = consolidate_memory_via_llm()
-                    st.session_state['consolidated_rules_json'] = clean_json_str
-                    st.session_state['show_consolidation_success'] = True
-                    st.session_state['_auto_consolidated'] = True
+                st.session_state['consolidation_job'] = submit_session_job(
+                    job_key("consolidate_memory"), consolidate_memory_via_llm
+                )
+                st.session_state['_auto_consolidated'] = True
             
             # --- Feedback + Merge Card ---
             # Inject a stable marker right before the container
@@ -458,11 +528,17 @@ if app_option != "Select the Usecase":
                 
                 # Button is now INSIDE the bordered card
                 if st.button("Merge & Download Rulebook", use_container_width=True):
-                    with st.spinner("AI is merging your corrections..."):
-                        clean_json_str = consolidate_memory_via_llm()
-                        st.session_state['consolidated_rules_json'] = clean_json_str
-                        st.session_state['show_consolidation_success'] = True
-                        
+                    st.session_state['consolidation_job'] = submit_session_job(
+                        job_key("consolidate_memory"), consolidate_memory_via_llm
+                    )
+
+                clean_json_str = collect_job('consolidation_job', "AI is merging your corrections...")
+                if isinstance(clean_json_str, str):
+                    st.session_state['consolidated_rules_json'] = clean_json_str
+                    st.session_state['show_consolidation_success'] = True
+                elif clean_json_str is not None:
+                    st.error(f"Merge failed: {clean_json_str['error']}")
+
                 if st.session_state.get('show_consolidation_success') and 'consolidated_rules_json' in st.session_state:
                     st.markdown("""
                     <div style="
@@ -511,7 +587,7 @@ if app_option != "Select the Usecase":
                 st.session_state.current_file_name = file_name
             elif st.session_state.current_file_name != file_name:
                 # File changed! Wipe staged precedents and process state
-                for key in ['eval_stage', 'pdf_text', 'l1_data', 'l2_data', 'l3_data', 'staged_precedents']:
+                for key in ['eval_stage', 'pdf_doc_id', 'l1_data', 'l2_data', 'l3_data', 'staged_precedents', 'cucp_next_job', 'cucp_rerun_job']:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.session_state.current_file_name = file_name
@@ -526,9 +602,12 @@ if app_option != "Select the Usecase":
                     "level_2_precedents": [],
                     "level_3_precedents": []
                 }
-            if 'pdf_text' not in st.session_state:
-                from src.cucp_reevals import extract_text_from_pdf
-                st.session_state.pdf_text = extract_text_from_pdf(cucp_file)
+            # The narrative's text lives in the shared document store; the
+            # session keeps only its id (re-added from the upload if evicted)
+            from src.cucp_reevals import extract_text_from_pdf
+            from src.document_store import put_document
+            st.session_state.pdf_doc_id = put_document(cucp_file)
+            pdf_text = extract_text_from_pdf(cucp_file)
             
             from src.cucp_reevals import run_level_1_extraction, run_level_2_classification, run_level_3_thresholds, generate_final_md_report
             from src.memory_manager import add_precedent
@@ -569,12 +648,16 @@ if app_option != "Select the Usecase":
                         
                 st.markdown("---")
                 if st.button("Start AI Evaluation ➔", type="primary"):
-                    with st.spinner(f"Running Step 1: Reading and extracting facts from **{file_name}**..."):
-                        l1_result = run_level_1_extraction(
-                            st.session_state.pdf_text, 
-                            firm_revenues, 
-                            staged_precedents=st.session_state.staged_precedents.get("level_1_precedents", [])
-                        )
+                    l1_precedents = st.session_state.staged_precedents.get("level_1_precedents", [])
+                    st.session_state.cucp_next_job = submit_session_job(
+                        job_key("cucp_level_1", st.session_state.pdf_doc_id, firm_revenues, l1_precedents),
+                        run_level_1_extraction,
+                        pdf_text,
+                        firm_revenues,
+                        staged_precedents=l1_precedents,
+                    )
+                l1_result = collect_job("cucp_next_job", f"Running Step 1: Reading and extracting facts from **{file_name}**...")
+                if l1_result is not None:
                     if "error" in l1_result:
                         st.error(f"⚠️ Something went wrong during fact extraction: {l1_result['error']}")
                     else:
@@ -651,14 +734,19 @@ if app_option != "Select the Usecase":
                                 "human_reasoning": reasoning_val
                             })
                             # Auto re-run Level 1 with the new correction and stay on review
-                            with st.spinner(f"Re-running Fact Extraction with your correction..."):
-                                l1_result = run_level_1_extraction(
-                                    st.session_state.pdf_text,
-                                    firm_revenues,
-                                    staged_precedents=st.session_state.staged_precedents.get("level_1_precedents", [])
-                                )
-                                st.session_state.l1_data = l1_result
-                            st.rerun()
+                            l1_precedents = st.session_state.staged_precedents.get("level_1_precedents", [])
+                            st.session_state.cucp_rerun_job = submit_session_job(
+                                job_key("cucp_level_1", st.session_state.pdf_doc_id, firm_revenues, l1_precedents),
+                                run_level_1_extraction,
+                                pdf_text,
+                                firm_revenues,
+                                staged_precedents=l1_precedents,
+                            )
+
+                l1_result = collect_job("cucp_rerun_job", "Re-running Fact Extraction with your correction...")
+                if l1_result is not None:
+                    st.session_state.l1_data = l1_result
+                    st.rerun()
                 
                 st.caption("*Your corrections are saved only after you approve the final evaluation at the end.*")
                 
@@ -668,12 +756,17 @@ if app_option != "Select the Usecase":
                 combined_financials = f"Excel Cross-Reference Revenue/PNW: {excel_pnw}\nNarrative Declared PNW: {narrative_pnw}"
                 
                 if st.button("Approve & Continue ➔", type="primary"):
-                    with st.spinner("Running Step 2: Legal Classification..."):
-                        l2_result = run_level_2_classification(
-                            st.session_state.l1_data.get('extracted_facts', []),
-                            combined_financials,
-                            staged_precedents=st.session_state.staged_precedents.get("level_2_precedents", [])
-                        )
+                    facts = st.session_state.l1_data.get('extracted_facts', [])
+                    l2_precedents = st.session_state.staged_precedents.get("level_2_precedents", [])
+                    st.session_state.cucp_next_job = submit_session_job(
+                        job_key("cucp_level_2", facts, combined_financials, l2_precedents),
+                        run_level_2_classification,
+                        facts,
+                        combined_financials,
+                        staged_precedents=l2_precedents,
+                    )
+                l2_result = collect_job("cucp_next_job", "Running Step 2: Legal Classification...")
+                if l2_result is not None:
                     if "error" in l2_result:
                         st.error(f"⚠️ Something went wrong during classification: {l2_result['error']}")
                     else:
@@ -741,14 +834,21 @@ if app_option != "Select the Usecase":
                             excel_pnw_rerun = st.session_state.l1_data.get("cross_reference_result", "None")
                             narrative_pnw_rerun = st.session_state.l1_data.get("narrative_pnw", "NOT PROVIDED")
                             combined_financials_rerun = f"Excel Cross-Reference Revenue/PNW: {excel_pnw_rerun}\nNarrative Declared PNW: {narrative_pnw_rerun}"
-                            with st.spinner("Re-evaluating Classifications..."):
-                                st.session_state.l2_data = run_level_2_classification(
-                                    st.session_state.l1_data.get('extracted_facts', []),
-                                    combined_financials_rerun,
-                                    staged_precedents=st.session_state.staged_precedents.get("level_2_precedents", [])
-                                )
-                            st.rerun()
-                            
+                            facts = st.session_state.l1_data.get('extracted_facts', [])
+                            l2_precedents = st.session_state.staged_precedents.get("level_2_precedents", [])
+                            st.session_state.cucp_rerun_job = submit_session_job(
+                                job_key("cucp_level_2", facts, combined_financials_rerun, l2_precedents),
+                                run_level_2_classification,
+                                facts,
+                                combined_financials_rerun,
+                                staged_precedents=l2_precedents,
+                            )
+
+                l2_result = collect_job("cucp_rerun_job", "Re-evaluating Classifications...")
+                if l2_result is not None:
+                    st.session_state.l2_data = l2_result
+                    st.rerun()
+
                 st.caption("*Your corrections are saved only after you approve the final evaluation at the end.*")
 
                 excel_pnw = st.session_state.l1_data.get("cross_reference_result", "None")
@@ -756,13 +856,19 @@ if app_option != "Select the Usecase":
                 combined_financials = f"Excel Cross-Reference Revenue/PNW: {excel_pnw}\nNarrative Declared PNW: {narrative_pnw}"
 
                 if st.button("Approve & Continue ➔", type="primary"):
-                    with st.spinner("Running Step 3: Evidentiary Thresholds..."):
-                        l3_result = run_level_3_thresholds(
-                            st.session_state.l2_data.get("classifications", []), 
-                            st.session_state.l1_data.get("extracted_facts", []), 
-                            combined_financials,
-                            staged_precedents=st.session_state.staged_precedents.get("level_3_precedents", [])
-                        )
+                    classifications = st.session_state.l2_data.get("classifications", [])
+                    facts = st.session_state.l1_data.get("extracted_facts", [])
+                    l3_precedents = st.session_state.staged_precedents.get("level_3_precedents", [])
+                    st.session_state.cucp_next_job = submit_session_job(
+                        job_key("cucp_level_3", classifications, facts, combined_financials, l3_precedents),
+                        run_level_3_thresholds,
+                        classifications,
+                        facts,
+                        combined_financials,
+                        staged_precedents=l3_precedents,
+                    )
+                l3_result = collect_job("cucp_next_job", "Running Step 3: Evidentiary Thresholds...")
+                if l3_result is not None:
                     if "error" in l3_result:
                         st.error(f"⚠️ Something went wrong during threshold evaluation: {l3_result['error']}")
                     else:
@@ -834,15 +940,23 @@ if app_option != "Select the Usecase":
                             excel_pnw_rerun = st.session_state.l1_data.get("cross_reference_result", "None")
                             narrative_pnw_rerun = st.session_state.l1_data.get("narrative_pnw", "NOT PROVIDED")
                             combined_financials_rerun = f"Excel Cross-Reference Revenue/PNW: {excel_pnw_rerun}\nNarrative Declared PNW: {narrative_pnw_rerun}"
-                            with st.spinner("Re-evaluating decisions..."):
-                                st.session_state.l3_data = run_level_3_thresholds(
-                                    st.session_state.l2_data.get("classifications", []), 
-                                    st.session_state.l1_data.get("extracted_facts", []), 
-                                    combined_financials_rerun,
-                                    staged_precedents=st.session_state.staged_precedents.get("level_3_precedents", [])
-                                )
-                            st.rerun()
-                            
+                            classifications = st.session_state.l2_data.get("classifications", [])
+                            facts = st.session_state.l1_data.get("extracted_facts", [])
+                            l3_precedents = st.session_state.staged_precedents.get("level_3_precedents", [])
+                            st.session_state.cucp_rerun_job = submit_session_job(
+                                job_key("cucp_level_3", classifications, facts, combined_financials_rerun, l3_precedents),
+                                run_level_3_thresholds,
+                                classifications,
+                                facts,
+                                combined_financials_rerun,
+                                staged_precedents=l3_precedents,
+                            )
+
+                l3_result = collect_job("cucp_rerun_job", "Re-evaluating decisions...")
+                if l3_result is not None:
+                    st.session_state.l3_data = l3_result
+                    st.rerun()
+
                 st.caption("*Your corrections are saved only after you approve the final evaluation below.*")
 
                 if st.button("Approve Final Evaluation & Commit Corrections ➔", type="primary"):
@@ -868,7 +982,7 @@ if app_option != "Select the Usecase":
                         st.rerun()
                 with colB:
                     if st.button("🔄 Reset / Start Over"):
-                        for key in ['eval_stage', 'pdf_text', 'l1_data', 'l2_data', 'l3_data', 'staged_precedents', 'consolidated_rules_json', 'show_consolidation_success']:
+                        for key in ['eval_stage', 'pdf_doc_id', 'l1_data', 'l2_data', 'l3_data', 'staged_precedents', 'consolidated_rules_json', 'show_consolidation_success']:
                             if key in st.session_state:
                                 del st.session_state[key]
                         st.rerun()
@@ -964,7 +1078,8 @@ if app_option != "Select the Usecase":
                     buf.seek(0)
                     return buf
 
-                excel_buf = build_excel(result_md, f"CUCP Evaluation — {file_name}")
+                with span("excel.export"):
+                    excel_buf = build_excel(result_md, f"CUCP Evaluation — {file_name}")
                 dl_col1, dl_col2 = st.columns([1, 4])
                 with dl_col1:
                     st.download_button(
@@ -986,6 +1101,48 @@ if app_option != "Select the Usecase":
             )
         text_based("LLM Evaluation", knowledge_base)
 
+        # Batch mode: answer and score a whole question set against the same document
+        with st.expander("📋 Batch Evaluation (question set)", expanded="batch_eval_job" in st.session_state):
+            st.caption(
+                "Upload a CSV with a `question` column (and optionally `expected_answer`), "
+                "or a JSON list of the same. Every question is answered from the policy "
+                "document above and scored with the DeepEval metrics."
+            )
+            question_set = st.file_uploader(
+                "Upload Question Set",
+                type=["csv", "json"],
+                key="question_set_upload",
+            )
+            if st.button(
+                "Run Batch Evaluation",
+                disabled=knowledge_base is None or question_set is None,
+            ):
+                from src.document_store import get_bytes, put_document
+                from src.llm_evaluation import load_question_set, run_batch_evaluation
+
+                try:
+                    cases = load_question_set(question_set)
+                except Exception as e:
+                    st.error(f"⚠️ Could not read the question set: {e}")
+                else:
+                    doc_id = put_document(knowledge_base)
+                    st.session_state.batch_eval_job = submit_session_job(
+                        job_key("batch_evaluation", doc_id, cases),
+                        run_batch_evaluation,
+                        get_bytes(doc_id) or knowledge_base.getvalue(),
+                        cases,
+                    )
+            batch_result = collect_job("batch_eval_job", "Answering and scoring the question set...")
+            if batch_result is not None:
+                if "error" in batch_result:
+                    st.error(f"⚠️ Batch evaluation failed: {batch_result['error']}")
+                else:
+                    st.session_state.batch_eval_results = batch_result
+            if "batch_eval_results" in st.session_state:
+                from src.llm_evaluation import render_batch_results
+
+                render_batch_results(st.session_state.batch_eval_results)
+
     elif app_option == "Foundation Model":
         foundation_model_chat_ui()
     elif app_option == "Highway Incident Summarizer Bot":
@@ -1016,6 +1173,9 @@ if app_option != "Select the Usecase":
     elif app_option == "Highway Incident Summarizer":
         highway_incident_ui(app_option)
 
+    elif app_option == "LLM Telemetry":
+        llm_telemetry_ui()
+
     else:
         with col22:
             st.subheader("Scope of Data Exchange")
@@ -1036,3 +1196,7 @@ if app_option != "Select the Usecase":
             "Chronic Conditions",
             "Prescribed Medications",
         ]
+
+# Per-stage timings of this session's recent requests (TRACING_ENABLED=true)
+if TRACING_ENABLED and app_option != "Select the Usecase":
+    render_trace_panel(st.session_state.get("debug_traces", []))
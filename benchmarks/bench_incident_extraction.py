@@ -0,0 +1,146 @@
+"""
+Benchmark the streaming incident extractor against the original
+BeautifulSoup get_text() + line-scan pipeline on the saved Caltrans pages.
+
+Usage:
+    python benchmarks/bench_incident_extraction.py [--iterations 200]
+
+Fails if the two pipelines produce different incident text for any fixture,
+if route extraction from chat prompts differs from PROMPT_ROUTES, or if an
+incident line is classified differently from LINE_CONDITIONS.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The summarizer builds its Groq client at import; no LLM call is made here.
+os.environ.setdefault("GROQ_API_KEY", "stub")
+
+from src.highway_incident_summarizer import (
+    answer_from_records,
+    extract_highways_from_prompt,
+    extract_incident_text_from_html,
+    parse_incident_records,
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "caltrans")
+
+# Prompt -> routes looked up; every route costs a page fetch and a summary.
+PROMPT_ROUTES = [
+    ("Any incidents on I-5?", ["5"]),
+    ("Compare I-80 and US-50 traffic", ["80", "50"]),
+    ("route 1 and 101", ["1", "101"]),
+    ("I-80, 50 and 99", ["80", "50", "99"]),
+    ("Is 80 closed for the next 2 hours?", ["80"]),
+    ("what about 5 tomorrow at 10", ["5"]),
+    ("SR-99 at 2 PM and I-5", ["99", "5"]),
+    ("I-680 southbound lanes 2 and 3", ["680"]),
+    ("How is traffic today?", ["5"]),
+]
+
+# Incident line -> condition type; chain controls and closures are answered
+# from these records without the LLM, so a miss is served as a confident "none".
+LINE_CONDITIONS = [
+    ("CHAINS OR SNOW TIRES ARE REQUIRED FROM 2 MI WEST OF APPLEGATE /PLACER CO/ TO KINGVALE /PLACER CO/", "chain_control"),
+    ("CHAINS ARE REQUIRED ON ALL VEHICLES EXCEPT 4-WHEEL-DRIVE VEHICLES WITH SNOW TIRES ON ALL 4 WHEELS FROM KYBURZ /EL DORADO CO/ TO MEYERS /EL DORADO CO/", "chain_control"),
+    ("R2 CHAIN CONTROLS ARE IN EFFECT FROM KYBURZ /EL DORADO CO/ TO MEYERS /EL DORADO CO/", "chain_control"),
+    ("CHAINS ARE NOT REQUIRED AT THIS TIME", "advisory"),
+    ("THE CONNECTOR FROM WB I-80 TO SR 89 IS CLOSED", "ramp_closure"),
+    ("THE EASTBOUND OFF-RAMP TO SR 89 IS CLOSED", "ramp_closure"),
+    ("THE RIGHT LANE IS CLOSED FROM COLFAX TO GOLD RUN", "lane_closure"),
+    ("IS CLOSED FROM THE JCT OF SR 89 TO THE NEVADA STATE LINE - DUE TO SNOW", "closure"),
+]
+
+
+def baseline_extract(html: str) -> str:
+    """The pre-streaming pipeline: full soup, get_text, then a per-line scan."""
+    raw_text = BeautifulSoup(html, "html.parser").get_text(separator="\n")
+    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
+
+    capturing = False
+    output = []
+    for line in lines:
+        upper = line.upper()
+        if upper.startswith("[IN THE") and "AREA" in upper:
+            capturing = True
+        if capturing:
+            output.append(line)
+        if "CONDITIONS OF USE" in upper or "PRIVACY POLICY" in upper:
+            break
+
+    bad = [
+        "ENTER HIGHWAY NUMBER",
+        "CHECK CURRENT",
+        "MAPS",
+        "QUICKMAP",
+        "CONTACT US",
+        "ACCESSIBILITY",
+        "PRIVACY POLICY",
+        "CONDITIONS OF USE",
+        "BACK TO TOP",
+        "KNOW BEFORE YOU GO",
+    ]
+    clean = [l for l in output if not any(b in l.upper() for b in bad)]
+    return "\n".join(clean)
+
+
+def time_it(fn, html, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(html)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incident extraction benchmark")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<18}{'bytes':>8}{'soup ms':>10}{'stream ms':>11}{'speedup':>9}")
+    mismatches = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        name = os.path.basename(path)
+
+        if baseline_extract(html) != extract_incident_text_from_html(html):
+            mismatches.append(name)
+
+        soup_ms = time_it(baseline_extract, html, args.iterations)
+        stream_ms = time_it(extract_incident_text_from_html, html, args.iterations)
+        print(
+            f"{name:<18}{len(html):>8}{soup_ms:>10.3f}{stream_ms:>11.3f}"
+            f"{soup_ms / stream_ms:>8.1f}x"
+        )
+
+    for prompt, expected in PROMPT_ROUTES:
+        routes = extract_highways_from_prompt(prompt)
+        if routes != expected:
+            mismatches.append(f"prompt {prompt!r}: {routes} != {expected}")
+
+    for line, expected in LINE_CONDITIONS:
+        record = parse_incident_records(f"[IN THE SIERRA NEVADA AREA]\n{line}", "80")[0]
+        if record["condition"] != expected:
+            mismatches.append(f"line {line!r}: {record['condition']} != {expected}")
+
+    r1_records = parse_incident_records(
+        f"[IN THE SIERRA NEVADA AREA]\n{LINE_CONDITIONS[0][0]}", "80"
+    )
+    answer = answer_from_records("Are chains required on I-80?", "80", r1_records)
+    if not answer.startswith("Chain controls are in effect"):
+        mismatches.append(f"R1 chain question answered {answer!r}")
+
+    if mismatches:
+        print("Output differs for:", ", ".join(mismatches))
+        sys.exit(1)
+    print("Output identical for all fixtures, prompts and incident lines.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Throughput and latency of the LLM-backed paths, fully offline.
+
+Starts benchmarks/mock_llm_server.py and the Caltrans stub, points the
+OpenAI/Groq SDKs and CALTRANS_ROAD_URL at them, generates fixture documents
+and drives the real code paths:
+  policy     policy_agent over the Standard Plans PDF
+  cucp       extract_text_from_pdf + CUCP levels 1-3 + report
+  highway    summarize_caltrans_incidents for a two-route trip
+  judge      llm_as_judge_agent over the Standard Plans PDF
+  narrative  personal_narrative_insights (Assistants run)
+Each scenario is run --iterations times on --concurrency threads and reported
+as throughput and p50/p95 latency, with the mock server's request counts.
+
+Usage:
+    python benchmarks/bench_llm_paths.py [--iterations 20] [--concurrency 4]
+        [--latency 0.2] [--tokens-per-second 400] [--error-rate 0.0] [--rpm 0]
+        [--scenarios policy,cucp,highway,judge,narrative] [--warm-caches]
+
+Caches (responses, judge verdicts, incident summaries, parsed documents) are cleared before
+every iteration unless --warm-caches is given, so by default each run
+measures the full path.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import caltrans_stub_server
+import make_fixtures
+import mock_llm_server
+
+QUESTIONS = [
+    "What changed in the concrete barrier footing details in Plan A76A?",
+    "Which retroreflective marker changes were made in Plans A20B and A24E?",
+    "What are the new chamfer dimensions for Type 60M barriers?",
+    "How does the thrie beam transition to the Midwest Guardrail System now work?",
+    "What anchor embedment do bridge departure connections require?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_scenarios(fixtures, warm):
+    """Scenario name -> fn(iteration) raising on a failed run. Imports happen here,
+    after the environment points every client at the local servers."""
+    import pandas as pd
+
+    from src import document_store
+    from src import highway_incident_summarizer as his
+    from src import reentry_care_plan as rcp
+    from src.cucp_reevals import (
+        extract_text_from_pdf,
+        generate_final_md_report,
+        run_level_1_extraction,
+        run_level_2_classification,
+        run_level_3_thresholds,
+    )
+    from src.personal_narrative_insights import personal_narrative_insights
+    from src.response_cache import response_cache
+
+    firms = pd.read_excel(fixtures["revenue_xlsx"], sheet_name="Firms", header=2)
+    firm_revenues = dict(zip(firms["Firm Name"], firms["Five Year Average"]))
+
+    def reset():
+        if not warm:
+            response_cache.clear()
+            document_store.clear_documents()
+            rcp._judge_verdict_cache.clear()
+            his._summary_cache.clear()
+            with his._page_cache_lock:
+                his._page_cache.clear()
+
+    def policy(i):
+        reset()
+        with open(fixtures["policy_pdf"], "rb") as f:
+            answer = rcp.policy_agent(QUESTIONS[i % len(QUESTIONS)], f)
+        if not answer or answer.startswith(("⚠️", "⛔", "Error")):
+            raise RuntimeError(answer)
+
+    def cucp(i):
+        text = extract_text_from_pdf(fixtures["narrative_pdf"])
+        l1 = run_level_1_extraction(text, firm_revenues)
+        l2 = run_level_2_classification(l1.get("extracted_facts", []))
+        l3 = run_level_3_thresholds(
+            l2.get("classifications", []),
+            l1.get("extracted_facts", []),
+            l1.get("cross_reference_result", "None"),
+        )
+        for result in (l1, l2, l3):
+            if "error" in result:
+                raise RuntimeError(result["error"])
+        generate_final_md_report(l1, l3)
+
+    def highway(i):
+        reset()
+        summary = his.summarize_caltrans_incidents("Give me an overview of I-80 and Route 50 today")
+        if "Could not retrieve" in summary:
+            raise RuntimeError(summary)
+
+    def judge(i):
+        reset()
+        output = rcp.llm_as_judge_agent(QUESTIONS[i % len(QUESTIONS)], fixtures["policy_pdf"])
+        if not output or output.startswith(("⚠️", "❌")):
+            raise RuntimeError(output)
+
+    def narrative(i):
+        answer = personal_narrative_insights("Summarize the applicant's main barriers.")
+        if not answer or answer.startswith("Error"):
+            raise RuntimeError(answer)
+
+    return {"policy": policy, "cucp": cucp, "highway": highway, "judge": judge, "narrative": narrative}
+
+
+def run_scenario(fn, iterations, concurrency):
+    latencies, errors = [], []
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            fn(i)
+        except Exception as e:
+            errors.append(str(e)[:120])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(iterations)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--scenarios", default="policy,cucp,highway,judge,narrative")
+    parser.add_argument("--warm-caches", action="store_true")
+    args = parser.parse_args()
+
+    llm_server = mock_llm_server.start_server(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rpm=args.rpm,
+        retry_after=0.2,
+    )
+    road_server = caltrans_stub_server.start_server(latency=0.05)
+    os.environ.update(mock_llm_server.client_environment(llm_server))
+    os.environ["CALTRANS_ROAD_URL"] = f"http://127.0.0.1:{road_server.server_port}/"
+    fixtures = make_fixtures.make_all(tempfile.mkdtemp(prefix="bench-fixtures-"), args.pages)
+
+    # Bare-mode Streamlit warns on every st.* call made outside a script run.
+    # Its config is parsed first, since parsing resets the log level.
+    import streamlit.logger
+    from streamlit import config as streamlit_config
+
+    streamlit_config.get_config_options()
+    streamlit.logger.set_log_level("error")
+
+    scenarios = build_scenarios(fixtures, args.warm_caches)
+    print(
+        f"mock latency {args.latency}s, {args.tokens_per_second:.0f} tok/s, "
+        f"429 rate {args.error_rate:.0%}, {args.iterations} iterations x {args.concurrency} threads"
+    )
+    print(f"{'scenario':<10} {'ok':>4} {'err':>4} {'req/s':>7} {'mean':>7} {'p50':>7} {'p95':>7} {'max':>7}")
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        latencies, errors, wall = run_scenario(scenarios[name], args.iterations, args.concurrency)
+        ok = len(latencies) - len(errors)
+        print(
+            f"{name:<10} {ok:>4} {len(errors):>4} {len(latencies) / wall:>7.2f} "
+            f"{sum(latencies) / len(latencies):>6.2f}s {percentile(latencies, 50):>6.2f}s "
+            f"{percentile(latencies, 95):>6.2f}s {max(latencies):>6.2f}s"
+        )
+        for error in sorted(set(errors))[:3]:
+            print(f"    error: {error}")
+
+    from src.llm_scheduler import get_scheduler_stats
+
+    scheduler = get_scheduler_stats()
+    print("\nmock server:", mock_llm_server.MockLLMHandler.stats)
+    print(
+        f"scheduler: {scheduler['calls']} calls, {scheduler['retries']} retries, "
+        f"{scheduler['rate_limited']} rate limited, {scheduler['throttled_seconds']:.1f}s throttled"
+    )
+    llm_server.shutdown()
+    road_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
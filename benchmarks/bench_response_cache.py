@@ -0,0 +1,84 @@
+"""
+Reuse decisions and lookup latency of the document Q&A response cache.
+
+Stores one answer per question of a labeled set of question pairs, then looks
+up the paired rewording: "same" pairs should reuse the stored answer,
+"different" pairs (other plan, negated, opposite comparative) must miss.
+No network calls are made.
+
+Usage:
+    python benchmarks/bench_response_cache.py [--iterations 2000]
+
+Fails if any "different" pair is served the other question's answer.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.response_cache import ResponseCache
+
+QUESTION_PAIRS = [
+    # Rewordings of the same question
+    ("What changes were made to Plan A76A in 2024?",
+     "What changes were made in Plan A76A for 2024?", "same"),
+    ("Explain the chamfer requirements for concrete barriers",
+     "Explain chamfer requirements in concrete barriers", "same"),
+    ("Why was #5 bar chosen over #4 bar in Plan A76A?",
+     "Why was the #5 bar chosen over the #4 bar in Plan A76A?", "same"),
+    # Different identifiers
+    ("What changed in Plan A76A in 2024?", "What changed in Plan A76B in 2024?", "different"),
+    # Opposite comparatives and negations
+    ("minimum footing thickness for the Type 60 concrete barrier in Plan A76A",
+     "maximum footing thickness for the Type 60 concrete barrier in Plan A76A", "different"),
+    ("Which markers are required on the barrier transition in Plan A20B?",
+     "Which markers are not required on the barrier transition in Plan A20B?", "different"),
+    ("Was the barrier height increased in the 2024 Standard Plans?",
+     "Was the barrier height decreased in the 2024 Standard Plans?", "different"),
+    ("What rebar spacing applies above the footing in Plan A76A?",
+     "What rebar spacing applies below the footing in Plan A76A?", "different"),
+    ("What did the 2023 edition require before the marker change?",
+     "What did the 2023 edition require after the marker change?", "different"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response cache benchmark")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    wrong = []
+    reused = 0
+    for stored, asked, label in QUESTION_PAIRS:
+        cache = ResponseCache()
+        cache.store("doc", "model", "v1", stored, f"answer to: {stored}")
+        hit = cache.lookup("doc", "model", "v1", asked) is not None
+        reused += hit
+        if hit != (label == "same"):
+            wrong.append((label, "hit" if hit else "miss", asked))
+
+    same = sum(1 for _, _, label in QUESTION_PAIRS if label == "same")
+    print(f"Question pairs: {len(QUESTION_PAIRS)} ({same} rewordings)")
+    print(f"Reused: {reused}; wrong decisions: {len(wrong)}")
+
+    cache = ResponseCache()
+    for i, (stored, _, _) in enumerate(QUESTION_PAIRS):
+        cache.store("doc", "model", "v1", stored, str(i))
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for _, asked, _ in QUESTION_PAIRS:
+            cache.lookup("doc", "model", "v1", asked)
+    per_call = (time.perf_counter() - start) / (args.iterations * len(QUESTION_PAIRS))
+    print(f"Latency: {per_call * 1e6:.1f} µs per lookup ({len(QUESTION_PAIRS)} stored answers)")
+
+    for label, outcome, text in wrong:
+        print(f"  [{label} -> {outcome}] {text}")
+    if any(label == "different" for label, _, _ in wrong):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Local stand-in for roads.dot.ca.gov.
+
+Serves the saved pages in benchmarks/fixtures/caltrans/ (route_<n>.html) with
+ETag / Last-Modified headers and answers conditional requests with 304, so the
+page cache in src/highway_incident_summarizer.py can be exercised offline.
+
+Usage:
+    python benchmarks/caltrans_stub_server.py --port 8765 --latency 0.4
+    CALTRANS_ROAD_URL=http://127.0.0.1:8765/ streamlit run app.py
+
+Running with --check starts the server on a free port, points the summarizer
+at it and verifies caching, revalidation and request coalescing.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "caltrans")
+STARTED_AT = formatdate(time.time(), usegmt=True)
+
+
+def load_page(route: str):
+    path = os.path.join(FIXTURE_DIR, f"route_{route}.html")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class CaltransStubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    # Counts of full (200) and conditional (304) responses, for --check.
+    stats = {"200": 0, "304": 0}
+    stats_lock = threading.Lock()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        route = query.get("roadnumber", ["5"])[0]
+        body = load_page(route)
+        if body is None:
+            self.send_error(404, f"No fixture for route {route}")
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.stats_lock:
+                self.stats["304"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        with self.stats_lock:
+            self.stats["200"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", STARTED_AT)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0, latency: float = 0.0) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread and return the running server."""
+    CaltransStubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), CaltransStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_check():
+    server = start_server(latency=0.2)
+    os.environ["CALTRANS_ROAD_URL"] = f"http://127.0.0.1:{server.server_port}/"
+    os.environ["CALTRANS_PAGE_TTL"] = "60"
+    # The summarizer builds its Groq client at import; no LLM call is made here.
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from src import highway_incident_summarizer as his
+
+    stats = CaltransStubHandler.stats
+
+    # Concurrent identical lookups coalesce into a single request.
+    threads = [
+        threading.Thread(target=his.fetch_caltrans_page, args=("80",))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert stats == {"200": 1, "304": 0}, stats
+
+    # A fresh page is served from memory.
+    start = time.perf_counter()
+    text = his.fetch_incident_text("80")
+    assert time.perf_counter() - start < 0.05
+    assert "[IN THE SIERRA NEVADA]" in text
+    assert stats == {"200": 1, "304": 0}, stats
+
+    # A forced refresh revalidates and gets a 304 for the unchanged page.
+    assert his.fetch_incident_text("80", force_refresh=True) == text
+    assert stats == {"200": 1, "304": 1}, stats
+
+    server.shutdown()
+    print("Caltrans stub check passed:", stats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    if args.check:
+        run_check()
+    else:
+        server = start_server(args.port, args.latency)
+        print(f"Serving Caltrans fixtures on http://127.0.0.1:{server.server_port}/")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
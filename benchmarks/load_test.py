@@ -0,0 +1,386 @@
+"""
+Load test: many concurrent headless Streamlit sessions against the mock LLM.
+
+Each simulated analyst is a streamlit.testing AppTest session running app.py
+in this process, so sessions share module-level state (caches, scheduler, job
+pool) exactly like sessions on one server. Every session walks through the
+chosen flows:
+  rag      RAG-Document Intelligence question over the Standard Plans PDF
+  cucp     CUCP evaluation: start, approve steps 1-3, final report
+  highway  Highway Incident Summarizer Bot question
+The LLM calls go to benchmarks/mock_llm_server.py and the road pages to the
+Caltrans stub. For each concurrency level it reports flow and script-rerun
+latency percentiles, failure rate, and memory per session. Errors raised by
+the test harness itself (AppTest internals rather than the app) are counted
+separately and excluded from the failure rate.
+
+Usage:
+    python benchmarks/load_test.py [--sessions 1,4,8] [--flows rag,cucp,highway]
+        [--latency 0.5] [--tokens-per-second 200] [--error-rate 0.0] [--no-cache]
+
+AppTest cannot drive upload widgets, so st.file_uploader is replaced with one
+that returns the generated fixture for each uploader key. CUCP approvals are
+written to a temporary copy of the precedent store, never to src/memory_db.json.
+
+Session.run drives AppTest's private _tree/_run API, so the driver refuses to
+start on any Streamlit version other than the one pinned in requirements.txt.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import caltrans_stub_server
+import make_fixtures
+import mock_llm_server
+from bench_llm_paths import QUESTIONS, percentile
+
+FLOW_TIMEOUT = 300
+# requirements.txt pin; Session relies on AppTest internals of this release
+TESTED_STREAMLIT_VERSION = "1.45.1"
+
+
+class FlowError(RuntimeError):
+    """The app misbehaved: script exception, missing answer, stage not reached."""
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (Linux), else the peak from getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def deep_size(obj, seen=None) -> int:
+    """Approximate bytes held by obj and everything it references."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    else:
+        if hasattr(obj, "getbuffer"):  # BytesIO, UploadedFile
+            size += obj.getbuffer().nbytes
+        if hasattr(obj, "__dict__"):
+            size += deep_size(vars(obj), seen)
+    return size
+
+
+def install_fake_uploader(fixtures):
+    import streamlit as st
+    from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+
+    by_key = {
+        "knowledge_base_upload": fixtures["policy_pdf"],
+        "policy_file_upload": fixtures["policy_pdf"],
+        "cucp_upload": fixtures["narrative_pdf"],
+        "revenue_upload": fixtures["revenue_xlsx"],
+    }
+    contents = {key: open(path, "rb").read() for key, path in by_key.items()}
+
+    def file_uploader(label, type=None, accept_multiple_files=False, key=None, **kwargs):
+        if key not in contents:
+            return [] if accept_multiple_files else None
+        record = UploadedFileRec(
+            file_id=key,
+            name=os.path.basename(by_key[key]),
+            type="application/octet-stream",
+            data=contents[key],
+        )
+        upload = UploadedFile(record, None)
+        return [upload] if accept_multiple_files else upload
+
+    st.file_uploader = file_uploader
+
+
+def install_shared_runtime():
+    """
+    One mock Runtime for every session. AppTest installs its own as the
+    Runtime singleton for each run and clears it afterwards, so with sessions
+    running concurrently one finishing run would pull the runtime out from
+    under the others.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+
+def install_shared_script_cache():
+    """
+    Compile app.py once for every session. AppTest builds a fresh ScriptCache
+    for each run, so concurrent sessions would compile the script at the same
+    time, and concurrent ast.parse calls can crash CPython 3.11 with
+    "SystemError: AST constructor recursion depth mismatch".
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    compile_script = ScriptCache.get_bytecode
+    bytecode = {}
+    lock = threading.Lock()
+
+    def get_bytecode(self, script_path):
+        script_path = os.path.abspath(script_path)
+        with lock:
+            if script_path not in bytecode:
+                bytecode[script_path] = compile_script(self, script_path)
+            return bytecode[script_path]
+
+    ScriptCache.get_bytecode = get_bytecode
+
+
+class Session:
+    """One simulated analyst; records the duration of every script run."""
+
+    def __init__(self, index):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.app = AppTest.from_file(os.path.join(REPO_DIR, "app.py"), default_timeout=FLOW_TIMEOUT)
+        self.reruns = []
+
+    def run(self, action=None):
+        """Rerun the script; action is the widget interaction (click, input) being sent."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+        from streamlit.testing.v1.element_tree import get_widget_state
+
+        # A job finishing mid-run triggers st.rerun(), which can leave widgets
+        # from the interrupted pass in AppTest's tree without any session
+        # state; AppTest.run() raises KeyError on those, so they are skipped.
+        states = WidgetStates()
+        for node in self.app._tree:
+            try:
+                state = get_widget_state(node)
+            except KeyError:
+                continue
+            if state is not None:
+                states.widgets.append(state)
+        start = time.perf_counter()
+        self.app._run(states)
+        self.reruns.append(time.perf_counter() - start)
+        if self.app.exception:
+            raise FlowError(self.app.exception[0].message)
+
+    def open_usecase(self, usecase):
+        if not self.reruns:
+            self.run()
+            self.run(self.app.selectbox(key="application").select("Caltrans"))
+        self.run(self.app.selectbox(key="app_select").select(usecase))
+
+    def click(self, label):
+        for button in self.app.button:
+            if button.label == label:
+                self.run(button.click())
+                return
+        raise FlowError(f"No button {label!r} on the page")
+
+    def ask(self, question):
+        answered = len(self.app.session_state["generated"]) if "generated" in self.app.session_state else 0
+        self.app.text_input(key="input").input(question)
+        self.click("Interact with LLM")
+        generated = self.app.session_state["generated"]
+        if len(generated) <= answered or not generated[-1]:
+            raise FlowError("No answer was added to the chat")
+
+    def wait_for_stage(self, stage):
+        deadline = time.monotonic() + FLOW_TIMEOUT
+        while self.app.session_state["eval_stage"] < stage:
+            if time.monotonic() > deadline:
+                raise FlowError(f"CUCP stage {stage} not reached")
+            time.sleep(0.1)
+            self.run()
+        self.run()  # drop elements left over from the pass that ended in st.rerun()
+
+    def state_size(self) -> int:
+        return deep_size(self.app.session_state.filtered_state)
+
+
+def rag_flow(session):
+    session.open_usecase("RAG-Document Intelligence")
+    session.ask(QUESTIONS[session.index % len(QUESTIONS)])
+
+
+def cucp_flow(session):
+    session.open_usecase("CUCP Re-Evaluations")
+    session.click("Start AI Evaluation ➔")
+    session.wait_for_stage(1)
+    session.click("Approve & Continue ➔")
+    session.wait_for_stage(2)
+    session.click("Approve & Continue ➔")
+    session.wait_for_stage(3)
+    session.click("Approve Final Evaluation & Commit Corrections ➔")
+    session.wait_for_stage(4)
+
+
+def highway_flow(session):
+    session.open_usecase("Highway Incident Summarizer Bot")
+    session.ask("Give me an overview of I-80 today")
+
+
+FLOWS = {"rag": rag_flow, "cucp": cucp_flow, "highway": highway_flow}
+
+
+def run_level(concurrency, flows):
+    """Run `concurrency` sessions at once; returns per-flow results and memory figures."""
+    results = {name: {"latencies": [], "errors": [], "harness_errors": []} for name in flows}
+    sessions = []
+    lock = threading.Lock()
+
+    def analyst(index):
+        session = Session(index)
+        with lock:
+            sessions.append(session)
+        for name in flows:
+            start = time.perf_counter()
+            kind, error = None, None
+            try:
+                FLOWS[name](session)
+            except FlowError as e:
+                kind, error = "errors", str(e)[:100]
+            except Exception as e:
+                kind, error = "harness_errors", f"{type(e).__name__}: {str(e)[:100]}"
+            with lock:
+                if kind == "harness_errors":
+                    results[name][kind].append(error)
+                    continue
+                results[name]["latencies"].append(time.perf_counter() - start)
+                if error:
+                    results[name][kind].append(error)
+
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(analyst, range(concurrency)))
+    wall = time.perf_counter() - start
+    # Sessions are still referenced here, so their state counts towards RSS
+    rss_per_session = max(0, rss_bytes() - rss_before) / concurrency
+    state_per_session = sum(s.state_size() for s in sessions) / concurrency
+    reruns = [r for s in sessions for r in s.reruns]
+    return results, reruns, wall, rss_per_session, state_per_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", default="1,4,8")
+    parser.add_argument("--flows", default="rag,cucp,highway")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    args = parser.parse_args()
+    flows = [f.strip() for f in args.flows.split(",") if f.strip()]
+
+    import streamlit
+
+    if streamlit.__version__ != TESTED_STREAMLIT_VERSION:
+        sys.exit(
+            f"load_test drives AppTest internals tested with Streamlit "
+            f"{TESTED_STREAMLIT_VERSION}, found {streamlit.__version__}"
+        )
+
+    llm_server = mock_llm_server.start_server(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rpm=args.rpm,
+        retry_after=0.5,
+    )
+    road_server = caltrans_stub_server.start_server(latency=0.1)
+    os.environ.update(mock_llm_server.client_environment(llm_server))
+    os.environ["CALTRANS_ROAD_URL"] = f"http://127.0.0.1:{road_server.server_port}/"
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    fixtures = make_fixtures.make_all(work_dir, args.pages)
+
+    # app.py opens style/ and image/ relative to the repository root
+    os.chdir(REPO_DIR)
+    import streamlit.logger
+    from streamlit import config as streamlit_config
+
+    streamlit_config.get_config_options()
+    streamlit.logger.set_log_level("error")
+    install_fake_uploader(fixtures)
+    install_shared_runtime()
+    install_shared_script_cache()
+
+    from src import memory_manager
+
+    memory_copy = os.path.join(work_dir, "memory_db.json")
+    if os.path.exists(memory_manager.MEMORY_FILE):
+        shutil.copy(memory_manager.MEMORY_FILE, memory_copy)
+    memory_manager.MEMORY_FILE = memory_copy
+    memory_manager.BACKUP_DIR = os.path.join(work_dir, "memory_backups")
+
+    print(
+        f"mock latency {args.latency}s, {args.tokens_per_second:.0f} tok/s, "
+        f"429 rate {args.error_rate:.0%}, flows: {', '.join(flows)}"
+    )
+    header = (
+        f"{'sessions':>8} {'flow':<8} {'ok':>4} {'fail%':>6} {'harness':>8} "
+        f"{'p50':>7} {'p95':>7} {'max':>7}"
+    )
+    for level in [int(n) for n in args.sessions.split(",") if n.strip()]:
+        results, reruns, wall, rss, state = run_level(level, flows)
+        print(f"\n{header}")
+        for name in flows:
+            latencies, errors = results[name]["latencies"], results[name]["errors"]
+            harness_errors = results[name]["harness_errors"]
+            if latencies:
+                print(
+                    f"{level:>8} {name:<8} {len(latencies) - len(errors):>4} "
+                    f"{len(errors) / len(latencies):>6.0%} {len(harness_errors):>8} "
+                    f"{percentile(latencies, 50):>6.2f}s "
+                    f"{percentile(latencies, 95):>6.2f}s {max(latencies):>6.2f}s"
+                )
+            else:
+                print(f"{level:>8} {name:<8} {0:>4} {'-':>6} {len(harness_errors):>8}")
+            for error in sorted(set(errors))[:3]:
+                print(f"{'':>14}error: {error}")
+            for error in sorted(set(harness_errors))[:3]:
+                print(f"{'':>14}harness error: {error}")
+        print(
+            f"{'':>8} reruns p50 {percentile(reruns, 50):.2f}s, p95 {percentile(reruns, 95):.2f}s; "
+            f"wall {wall:.1f}s; RSS +{rss / 2**20:.1f} MiB/session; "
+            f"session state {state / 2**10:.0f} KiB/session"
+        )
+
+    print("\nmock server:", mock_llm_server.MockLLMHandler.stats)
+    llm_server.shutdown()
+    road_server.shutdown()
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
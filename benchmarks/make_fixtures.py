@@ -0,0 +1,155 @@
+"""
+Synthetic input documents for the offline benchmarks.
+
+Writes a Standard Plans style policy PDF, an SED narrative PDF and a PNW /
+revenue workbook with a "Firms" sheet. The PDFs are plain text-only files
+written directly (no PDF library needed) that PyPDF2 extracts like the real
+uploads. The Caltrans road pages live in fixtures/caltrans/.
+
+Usage:
+    python benchmarks/make_fixtures.py [--out benchmarks/fixtures/generated] [--pages 40]
+"""
+
+import argparse
+import os
+import random
+import textwrap
+
+PLAN_SHEETS = ["A76A", "A76B", "A77L1", "A78C3", "A78C4", "A79A1", "A20B", "A24E", "A62D", "A88A"]
+
+POLICY_PARAGRAPHS = [
+    "Plan {plan} revises the concrete barrier footing. Pavement or PCC replaces "
+    "well-compacted base in the callouts, and #5 bars replace #4 bars at {spacing} inch spacing.",
+    "The transition on Plan {plan} between thrie beam and the Midwest Guardrail System now "
+    "uses a {spacing} inch rail height with nested W-beam over the last panel.",
+    "Retroreflective markers on Plan {plan} are spaced at {spacing} feet on tangent sections "
+    "and half that on curves with a radius under 1,000 feet.",
+    "Chamfer dimensions for Type 60M barriers on Plan {plan} changed to 3/4 inch; the lower "
+    "roadbed structural section is {spacing} inches for Type 60MA.",
+    "Bridge departure connections on Plan {plan} add a {spacing} inch anchor embedment and a "
+    "revised bolt pattern for the end block.",
+]
+
+NARRATIVE_PARAGRAPHS = [
+    "In {year}, our bid to a prime contractor in {city} was returned unopened after the "
+    "estimator learned who owned the firm. We lost a subcontract worth ${amount:,}.",
+    "Between {year} and {year_end}, bonding companies in {city} required collateral three times "
+    "what comparable firms posted, which kept us out of projects above ${amount:,}.",
+    "A district inspector in {city} rejected our compaction results in {year} while accepting "
+    "identical results from another firm, delaying payment of ${amount:,} for eight months.",
+    "Suppliers in {city} refused us trade credit in {year}, forcing cash purchases and costing "
+    "about ${amount:,} in lost discounts.",
+]
+
+CITIES = ["Sacramento", "Fresno", "Oakland", "Stockton", "Redding", "Bakersfield"]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: list):
+    """Write a text-only PDF, one string (wrapped at 90 columns) per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n"):
+            lines.extend(textwrap.wrap(paragraph, 90) or [""])
+        stream = "BT /F1 10 Tf 12 TL 50 760 Td\n"
+        stream += "".join(f"({_escape(line)}) Tj T*\n" for line in lines[:60])
+        stream += "ET"
+        data = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_policy_pdf(path: str, pages: int = 40, seed: int = 7):
+    """Standard Plans revision notes, about 3,000 characters per page."""
+    rng = random.Random(seed)
+    texts = []
+    for page in range(1, pages + 1):
+        paragraphs = [f"2024 CALTRANS STANDARD PLANS - REVISION SUMMARY - SHEET {page}"]
+        while sum(len(p) for p in paragraphs) < 3000:
+            paragraphs.append(rng.choice(POLICY_PARAGRAPHS).format(
+                plan=rng.choice(PLAN_SHEETS), spacing=rng.choice([6, 8, 12, 18, 24, 32])
+            ))
+        texts.append("\n".join(paragraphs))
+    write_pdf(path, texts)
+
+
+def make_narrative_pdf(path: str, incidents: int = 8, seed: int = 11):
+    """An SED narrative for the CUCP flow, a few incidents per page."""
+    rng = random.Random(seed)
+    paragraphs = [
+        "RE: Sierra Paving Co. - DBE Certification Personal Narrative",
+        "I am the majority owner of Sierra Paving Co., a paving subcontractor founded in 2011. "
+        "My personal net worth is $1,100,000.",
+    ]
+    for _ in range(incidents):
+        year = rng.randint(2014, 2022)
+        paragraphs.append(rng.choice(NARRATIVE_PARAGRAPHS).format(
+            year=year, year_end=year + 2, city=rng.choice(CITIES),
+            amount=rng.randrange(50_000, 900_000, 5_000),
+        ))
+    write_pdf(path, ["\n".join(paragraphs[i:i + 4]) for i in range(0, len(paragraphs), 4)])
+
+
+def make_revenue_workbook(path: str, firms: int = 200, seed: int = 13):
+    """PNW data workbook with a "Firms" sheet (Firm Name, Five Year Average)."""
+    import openpyxl
+
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Firms"
+    ws.append(["CUCP PNW Review - Revenue Data"])
+    ws.append([])
+    ws.append(["Firm Name", "Five Year Average"])
+    ws.append(["Sierra Paving Co.", 1_240_000])
+    for n in range(firms - 1):
+        ws.append([f"Firm {n:04d} Construction LLC", rng.randrange(200_000, 30_000_000, 1_000)])
+    wb.save(path)
+
+
+def make_all(out_dir: str, pages: int = 40) -> dict:
+    """Create every fixture in out_dir and return their paths by name."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "policy_pdf": os.path.join(out_dir, "standard_plans_2024.pdf"),
+        "narrative_pdf": os.path.join(out_dir, "sed_narrative.pdf"),
+        "revenue_xlsx": os.path.join(out_dir, "pnw_revenue.xlsx"),
+    }
+    make_policy_pdf(paths["policy_pdf"], pages)
+    make_narrative_pdf(paths["narrative_pdf"])
+    make_revenue_workbook(paths["revenue_xlsx"])
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "fixtures", "generated"))
+    parser.add_argument("--pages", type=int, default=40)
+    args = parser.parse_args()
+    for name, path in make_all(args.out, args.pages).items():
+        print(f"{name}: {path} ({os.path.getsize(path):,} bytes)")
@@ -0,0 +1,467 @@
+"""
+Local stand-in for the OpenAI and Groq APIs.
+
+Answers the endpoints the app calls with canned, correctly shaped responses:
+  POST .../chat/completions        OpenAI (/v1) and Groq (/openai/v1), stream=True too
+  POST /v1/moderations             never flags anything
+  POST /v1/threads/runs            streamed Assistants run on a new thread
+  POST /v1/threads/<id>/messages   follow-up message on an existing thread
+  POST /v1/threads/<id>/runs       streamed run on an existing thread
+  DELETE /v1/threads/<id>
+Chat replies are picked from the system prompt (CUCP levels, judge, incident
+summaries) and carry usage plus x-ratelimit-* headers, so the scheduler and
+telemetry see what they would see in production.
+
+Usage:
+    python benchmarks/mock_llm_server.py --port 8766 --latency 0.3 \\
+        --tokens-per-second 200 --error-rate 0.05 --rpm 600
+    OPENAI_BASE_URL=http://127.0.0.1:8766/v1 GROQ_BASE_URL=http://127.0.0.1:8766 \\
+        OPENAI_API_KEY=mock GROQ_API_KEY=mock streamlit run app.py
+
+--latency is the time to the first token, --tokens-per-second the generation
+speed after it, --error-rate the share of requests answered with a 429, and
+--rpm a per-minute request budget reported (and enforced) through the rate
+limit headers.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LEVEL_1_REPLY = {
+    "firm_name": "Sierra Paving Co.",
+    "cross_reference_result": "$1,240,000",
+    "narrative_pnw": "$1,100,000",
+    "extracted_facts": [
+        {
+            "id": f"fact_{n}",
+            "when": "2019",
+            "where": "Sacramento, CA",
+            "who": "Prime contractor",
+            "what": f"Bid rejected without explanation (incident {n})",
+            "why": "NOT PROVIDED",
+            "magnitude": "Lost subcontract worth $250,000",
+            "demographic_flag": n == 1,
+            "source_quote": "our bid was returned unopened",
+        }
+        for n in range(1, 4)
+    ],
+}
+
+LEVEL_2_REPLY = {
+    "classifications": [
+        {
+            "fact_id": f"fact_{n}",
+            "classification": "Systemic Barrier",
+            "reasoning": "Repeated exclusion from bid opportunities under 49 CFR §26.67.",
+        }
+        for n in range(1, 4)
+    ]
+}
+
+CRITERIA = [
+    "No Race or Sex Presumptions",
+    "Personal Net Worth",
+    "Disadvantage in American Society",
+    "Demonstration of Disadvantage",
+    "Specific Impediments",
+    "Link Between Impediments and Harm",
+    "Economic Disadvantage in Fact",
+]
+
+LEVEL_3_REPLY = {
+    "criteria": [
+        {
+            "s_no": n,
+            "category": "Mandatory Eligibility Requirements",
+            "qualification": name,
+            "rule_requires": "Individualized evidence under §26.67",
+            "evidence_summary": "The narrative describes repeated, specific incidents.",
+            "reasoning": "The evidence meets the preponderance standard.",
+            "pass_fail": "Pass",
+            "request_info": "No",
+            "confidence": 8.5,
+        }
+        for n, name in enumerate(CRITERIA, 1)
+    ],
+    "final_decision": "Yes",
+    "certifier_comments": "The applicant meets all SED requirements.",
+}
+
+JUDGE_REPLY = {
+    "accuracy_score": 0.9,
+    "completeness_score": 0.8,
+    "relevance_score": 0.9,
+    "clarity_score": 0.85,
+    "overall_score": 0.86,
+    "strengths": ["cites plan numbers"],
+    "weaknesses": ["could mention dimensions"],
+    "improvement_suggestions": ["add dimensions"],
+    "verdict": "PASS",
+}
+
+ANSWER_SENTENCES = [
+    "Plan A76A now calls for #5 bars at the barrier footing.",
+    "The 2024 edition replaces well-compacted base with Pavement or PCC in the callouts.",
+    "Type 60M barrier transitions were updated to match the Midwest Guardrail System.",
+    "Retroreflective marker spacing in Plans A20B and A24E was revised.",
+    "Chamfer dimensions on A78C3 and A78C4 changed to three quarters of an inch.",
+]
+
+MODERATION_CATEGORIES = [
+    "harassment",
+    "harassment/threatening",
+    "hate",
+    "hate/threatening",
+    "illicit",
+    "illicit/violent",
+    "self-harm",
+    "self-harm/instructions",
+    "self-harm/intent",
+    "sexual",
+    "sexual/minors",
+    "violence",
+    "violence/graphic",
+]
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def answer_text(max_tokens: int) -> str:
+    """A plausible Standard Plans answer of roughly max_tokens tokens."""
+    budget = max(20, min(max_tokens or 300, 400)) * 4
+    sentences = []
+    while sum(len(s) + 1 for s in sentences) < budget:
+        sentences.append(ANSWER_SENTENCES[len(sentences) % len(ANSWER_SENTENCES)])
+    return " ".join(sentences)
+
+
+def chat_reply(body: dict) -> str:
+    messages = body.get("messages") or []
+    system = " ".join(
+        m.get("content") or "" for m in messages
+        if m.get("role") == "system" and isinstance(m.get("content"), str)
+    )
+    prompt = " ".join(m.get("content") or "" for m in messages if isinstance(m.get("content"), str))
+
+    if "fact-extractor" in system:
+        return json.dumps(LEVEL_1_REPLY)
+    if "legal definer" in system:
+        return json.dumps(LEVEL_2_REPLY)
+    if "final evaluator" in system:
+        return json.dumps(LEVEL_3_REPLY)
+    if "expert evaluator" in system:
+        verdict = "FAIL" if random.random() < MockLLMHandler.judge_fail_rate else "PASS"
+        return json.dumps({**JUDGE_REPLY, "verdict": verdict})
+    if "Caltrans highway incident reports" in prompt:
+        return "\n".join(f"- {s}" for s in (
+            "Chain controls in effect near Donner Pass",
+            "One lane closed for construction near Truckee",
+            "Expect 15 minute delays through Sacramento",
+            "No closures reported in the Central Valley",
+            "Flooding cleared near Davis",
+        ))
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return "{}"
+    return answer_text(body.get("max_tokens"))
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    tokens_per_second = 0.0
+    error_rate = 0.0
+    retry_after = 0.5
+    rpm = 0
+    judge_fail_rate = 0.0
+    stats = {"requests": 0, "rate_limited": 0, "chat": 0, "stream": 0, "moderation": 0, "assistant": 0}
+    stats_lock = threading.Lock()
+    _window = {"started": 0.0, "count": 0}
+
+    # ----- plumbing -----
+    def _count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_sse(self, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _sse(self, data, event=None):
+        chunk = f"event: {event}\n" if event else ""
+        chunk += f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+        self.wfile.write(chunk.encode("utf-8"))
+        self.wfile.flush()
+
+    def _rate_limit(self):
+        """(headers, retry_after) for this request; retry_after is None unless it gets a 429."""
+        now = time.time()
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            window = self._window
+            if now - window["started"] >= 60:
+                window["started"], window["count"] = now, 0
+            window["count"] += 1
+            count, reset = window["count"], 60 - (now - window["started"])
+
+        headers = {}
+        retry_after = None
+        if self.rpm:
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-remaining-requests": str(max(0, self.rpm - count)),
+                "x-ratelimit-reset-requests": f"{reset:.2f}s",
+            }
+            if count > self.rpm:
+                retry_after = reset
+        if retry_after is None and random.random() < self.error_rate:
+            retry_after = self.retry_after
+        return headers, retry_after
+
+    def _reject(self, headers, retry_after):
+        self._count("rate_limited")
+        self._send_json(
+            429,
+            {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded",
+                       "code": "rate_limit_exceeded"}},
+            {**headers, "retry-after": f"{retry_after:.2f}"},
+        )
+
+    def _pace(self, tokens):
+        if self.tokens_per_second:
+            time.sleep(tokens / self.tokens_per_second)
+
+    # ----- routes -----
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        body = self._read_json()
+        headers, retry_after = self._rate_limit()
+        if retry_after is not None:
+            self._reject(headers, retry_after)
+            return
+
+        if path.endswith("/chat/completions"):
+            self._chat(body, headers, groq=path.startswith("/openai/"))
+        elif path.endswith("/moderations"):
+            self._moderation(body, headers)
+        elif path == "/v1/threads/runs":
+            self._run(f"thread_{uuid.uuid4().hex[:12]}", body, headers)
+        elif re.fullmatch(r"/v1/threads/[^/]+/messages", path):
+            self._message(path.split("/")[3], body)
+        elif re.fullmatch(r"/v1/threads/[^/]+/runs", path):
+            self._run(path.split("/")[3], body, headers)
+        else:
+            self._send_json(404, {"error": {"message": f"No mock for {path}"}})
+
+    def do_DELETE(self):
+        thread_id = self.path.rstrip("/").split("/")[-1]
+        self._send_json(200, {"id": thread_id, "object": "thread.deleted", "deleted": True})
+
+    def _chat(self, body, headers, groq):
+        text = chat_reply(body)
+        model = body.get("model", "mock")
+        usage = {
+            "prompt_tokens": count_tokens(json.dumps(body.get("messages", []))),
+            "completion_tokens": count_tokens(text),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        time.sleep(self.latency)
+        if not body.get("stream"):
+            self._count("chat")
+            self._pace(usage["completion_tokens"])
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers)
+            return
+
+        self._count("stream")
+        self._start_sse(headers)
+        base = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model}
+        pieces = re.findall(r"\S+\s*", text)
+        for i in range(0, len(pieces), 4):
+            piece = "".join(pieces[i:i + 4])
+            self._pace(count_tokens(piece))
+            self._sse({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+        last = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        if groq:
+            last["x_groq"] = {"id": completion_id, "usage": usage}
+        self._sse(last)
+        if not groq and (body.get("stream_options") or {}).get("include_usage"):
+            self._sse({**base, "choices": [], "usage": usage})
+        self._sse("[DONE]")
+
+    def _moderation(self, body, headers):
+        self._count("moderation")
+        time.sleep(self.latency / 4)
+        inputs = body.get("input")
+        count = len(inputs) if isinstance(inputs, list) else 1
+        result = {
+            "flagged": False,
+            "categories": {c: False for c in MODERATION_CATEGORIES},
+            "category_scores": {c: 0.001 for c in MODERATION_CATEGORIES},
+            "category_applied_input_types": {c: ["text"] for c in MODERATION_CATEGORIES},
+        }
+        self._send_json(200, {
+            "id": f"modr-{uuid.uuid4().hex[:12]}",
+            "model": body.get("model", "omni-moderation-latest"),
+            "results": [result] * count,
+        }, headers)
+
+    def _message(self, thread_id, body):
+        self._send_json(200, {
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "role": body.get("role", "user"),
+            "content": [{"type": "text", "text": {"value": body.get("content", ""), "annotations": []}}],
+            "attachments": [],
+            "metadata": {},
+            "status": "completed",
+        })
+
+    def _run(self, thread_id, body, headers):
+        """A streamed Assistants run: run/message lifecycle events around text deltas."""
+        self._count("assistant")
+        now = int(time.time())
+        text = answer_text(300)
+        run = {
+            "id": f"run_{uuid.uuid4().hex[:12]}",
+            "object": "thread.run",
+            "created_at": now,
+            "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id", "asst_mock"),
+            "status": "queued",
+            "model": "gpt-4o",
+            "instructions": "",
+            "tools": [],
+            "parallel_tool_calls": True,
+        }
+        message = {
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "object": "thread.message",
+            "created_at": now,
+            "thread_id": thread_id,
+            "run_id": run["id"],
+            "assistant_id": run["assistant_id"],
+            "role": "assistant",
+            "content": [],
+            "attachments": [],
+            "metadata": {},
+            "status": "in_progress",
+        }
+
+        self._start_sse(headers)
+        if self.path.rstrip("/") == "/v1/threads/runs":
+            self._sse({"id": thread_id, "object": "thread", "created_at": now, "metadata": {}},
+                      "thread.created")
+        self._sse(run, "thread.run.created")
+        time.sleep(self.latency)
+        self._sse({**run, "status": "in_progress"}, "thread.run.in_progress")
+        self._sse(message, "thread.message.created")
+        pieces = re.findall(r"\S+\s*", text)
+        for i in range(0, len(pieces), 4):
+            piece = "".join(pieces[i:i + 4])
+            self._pace(count_tokens(piece))
+            self._sse({
+                "id": message["id"],
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": piece, "annotations": []}}]},
+            }, "thread.message.delta")
+        self._sse({
+            **message,
+            "status": "completed",
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }, "thread.message.completed")
+        usage = {"prompt_tokens": count_tokens(json.dumps(body)), "completion_tokens": count_tokens(text)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self._sse({**run, "status": "completed", "completed_at": int(time.time()), "usage": usage},
+                  "thread.run.completed")
+        self._sse("[DONE]", "done")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port: int = 0, latency: float = 0.0, tokens_per_second: float = 0.0,
+                 error_rate: float = 0.0, rpm: int = 0, judge_fail_rate: float = 0.0,
+                 retry_after: float = 0.5) -> ThreadingHTTPServer:
+    """Start the mock API in a daemon thread and return the running server."""
+    MockLLMHandler.latency = latency
+    MockLLMHandler.tokens_per_second = tokens_per_second
+    MockLLMHandler.error_rate = error_rate
+    MockLLMHandler.rpm = rpm
+    MockLLMHandler.judge_fail_rate = judge_fail_rate
+    MockLLMHandler.retry_after = retry_after
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client_environment(server) -> dict:
+    """Environment variables that point the OpenAI and Groq SDKs at the server."""
+    base = f"http://127.0.0.1:{server.server_port}"
+    return {
+        "OPENAI_BASE_URL": f"{base}/v1",
+        "GROQ_BASE_URL": base,
+        "OPENAI_API_KEY": "mock",
+        "GROQ_API_KEY": "mock",
+        "CALTRANS_PERSONAL_NARRATIVE_INSIGHTS_ASSISTANT_ID": "asst_mock",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--judge-fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.tokens_per_second,
+                          args.error_rate, args.rpm, args.judge_fail_rate)
+    print(f"Mock OpenAI/Groq API on http://127.0.0.1:{server.server_port}/")
+    for name, value in client_environment(server).items():
+        print(f"  {name}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,15 +1,62 @@
 import time
+import uuid
 
 import streamlit as st
 from streamlit_feedback import streamlit_feedback
 
+from src.document_store import open_document, put_document
 from src.highway_incident_summarizer import summarize_caltrans_incidents
-from src.personal_narrative_insights import personal_narrative_insights
+from src.personal_narrative_insights import (
+    personal_narrative_insights_stream,
+    reset_session_thread,
+)
 from src.reentry_care_plan import (
     append_feedback_to_vector_file,
     policy_agent,
     run_guardrails,
 )
+from src.tracing import record_span, span
+
+
+def remember_document(knowledge_base):
+    """Keep only the shared document store id of the upload in the session."""
+    st.session_state.knowledge_base_id = (
+        put_document(knowledge_base) if knowledge_base is not None else None
+    )
+
+
+def render_judge_stream(events, refresh_interval=0.1):
+    """
+    Shows the judge pipeline's progress while it runs and returns its final output.
+
+    The live view is replaced by the normal chat history once the pipeline ends.
+    """
+    placeholder = st.empty()
+    status, answer, refined = "", "", ""
+    final_output = None
+    last_draw = 0.0
+    for event, payload in events:
+        if event == "final":
+            final_output = payload
+            break
+        if event == "status":
+            status = payload
+        elif event == "answer":
+            answer += payload
+        elif event == "refined":
+            refined += payload
+
+        # Redraw on stage changes, otherwise at most every refresh_interval
+        now = time.monotonic()
+        if event == "status" or now - last_draw >= refresh_interval:
+            last_draw = now
+            with placeholder.container():
+                st.caption(status)
+                if refined:
+                    st.markdown(f"## ✅ Improved Response\n{refined}")
+                st.markdown(answer)
+    placeholder.empty()
+    return final_output
 
 
 def text_based(usecase_option, knowledge_base):
@@ -105,6 +152,9 @@ def text_based(usecase_option, knowledge_base):
             ]
             # Crucially, reset the evaluation flag
             st.session_state.pop("evaluated_ix", None)
+            # A fresh chat also gets a fresh assistant thread
+            if "chat_session_id" in st.session_state:
+                reset_session_thread(st.session_state["chat_session_id"])
             st.session_state["reset_needed"] = False  # clear the flag
 
         if "generated" not in st.session_state:
@@ -114,6 +164,10 @@ def text_based(usecase_option, knowledge_base):
                 "Greetings! I am LLMAI Live Agent. How can I help you?"
             ]
 
+        # Identifies this browser session to server-side per-session state
+        if "chat_session_id" not in st.session_state:
+            st.session_state["chat_session_id"] = uuid.uuid4().hex
+
         # ---------------- Input and button ----------------
         response_container = st.container()
         container = st.container()
@@ -130,24 +184,27 @@ def text_based(usecase_option, knowledge_base):
                     usecase_option == "RAG-Document Intelligence"
                     or usecase_option == "Human in the feedback Loop"
                 ):
-                    st.session_state.knowledge_base = knowledge_base
+                    remember_document(knowledge_base)
                     vAR_Response = policy_agent(user_input, knowledge_base)
                     if knowledge_base is None:
                         return st.error("Please upload the policy analysis file")
                 elif usecase_option == "LLM as a Judge":
-                    from src.reentry_care_plan import llm_as_judge_agent
+                    from src.reentry_care_plan import llm_as_judge_agent_stream
 
-                    st.session_state.knowledge_base = knowledge_base
-                    vAR_Response = llm_as_judge_agent(user_input, knowledge_base)
+                    remember_document(knowledge_base)
+                    with span("llm_as_judge_agent"):
+                        vAR_Response = render_judge_stream(
+                            llm_as_judge_agent_stream(user_input, knowledge_base)
+                        )
                 elif usecase_option == "LLM Training":
                     from src.llm_training import llm_finetuning_agent
 
-                    st.session_state.knowledge_base = knowledge_base
+                    remember_document(knowledge_base)
                     vAR_Response = llm_finetuning_agent(user_input, knowledge_base)
                 elif usecase_option == "LLM Evaluation":
                     from src.llm_evaluation import llm_evaluation_agent
 
-                    st.session_state.knowledge_base = knowledge_base
+                    remember_document(knowledge_base)
                     vAR_Response = llm_evaluation_agent(user_input, knowledge_base)
                 elif usecase_option == "Highway Incident Summarizer Bot":
                     vAR_Response = summarize_caltrans_incidents(user_input)
@@ -157,7 +214,16 @@ def text_based(usecase_option, knowledge_base):
                         msg if not is_safe else "Your input passed the safety checks."
                     )
                 elif usecase_option == "Personal Narrative Insights":
-                    vAR_Response = personal_narrative_insights(user_input)
+                    # Show the answer as it streams in; the placeholder is cleared once
+                    # the full response joins the chat history below.
+                    stream_placeholder = st.empty()
+                    with stream_placeholder.container():
+                        vAR_Response = st.write_stream(
+                            personal_narrative_insights_stream(
+                                user_input, st.session_state["chat_session_id"]
+                            )
+                        )
+                    stream_placeholder.empty()
 
                 # elif usecase_option == "CUCP Re-Evaluations":
                 #     vAR_Response = cucp_reevaluations(user_input)
@@ -171,6 +237,7 @@ def text_based(usecase_option, knowledge_base):
                 )
 
         # ---------------- Response display ----------------
+        render_started = time.perf_counter()
         if st.session_state["generated"]:
             with response_container:
                 for i in range(len(st.session_state["generated"])):
@@ -233,7 +300,7 @@ def text_based(usecase_option, knowledge_base):
                                 from src.llm_evaluation import evaluate_last_response
 
                                 # Run evaluation and store results
-                                eval_output = evaluate_last_response()
+                                eval_output = evaluate_last_response(knowledge_base)
                                 st.session_state[eval_key] = eval_output
                                 st.rerun()
                         else:
@@ -269,7 +336,9 @@ def text_based(usecase_option, knowledge_base):
                                     feedback_text,
                                     score,
                                     st.session_state.client,
-                                    st.session_state.knowledge_base,
+                                    # Evicted from the document store: use the upload
+                                    open_document(st.session_state.get("knowledge_base_id"))
+                                    or knowledge_base,
                                 )
                                 if result.startswith("✅"):
                                     st.success(result)
@@ -289,3 +358,5 @@ def text_based(usecase_option, knowledge_base):
                                     st.error(result)
 
                                 st.success("Thank you for your feedback!")
+
+        record_span("chat.render", render_started)
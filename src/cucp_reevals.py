@@ -2,15 +2,19 @@ import json
 import datetime
 from openai import OpenAI
 from PyPDF2 import PdfReader
+from src.document_store import document_pages
+from src.llm_scheduler import chat_completion
 from src.memory_manager import get_precedents
+from src.tracing import traced
 
 client = OpenAI()
 
+@traced("pdf.extract")
 def extract_text_from_pdf(pdf_path):
-    reader = PdfReader(pdf_path)
+    # Pages are parsed once per document in the shared document store
+    _, pages = document_pages(pdf_path)
     text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
+    for page_text in pages:
         if page_text:
             text += page_text + "\n"
     return text
@@ -18,6 +22,7 @@ def extract_text_from_pdf(pdf_path):
 # ==============================================================================
 # LEVEL 1: FACT EXTRACTION (The "Perceptual" Layer)
 # ==============================================================================
+@traced("cucp.level_1")
 def run_level_1_extraction(narrative_text: str, firm_revenues: dict = None, staged_precedents: list = None) -> dict:
     level_1_precedents = get_precedents(1)
     if staged_precedents:
@@ -67,7 +72,9 @@ CRITICAL: Replace every placeholder below with REAL data extracted from the narr
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
+            "openai",
             model="gpt-4o",
             response_format={"type": "json_object"},
             messages=[
@@ -81,7 +88,9 @@ CRITICAL: Replace every placeholder below with REAL data extracted from the narr
             return json.loads(response.choices[0].message.content)
         except json.JSONDecodeError:
             # Retry once on malformed JSON
-            retry = client.chat.completions.create(
+            retry = chat_completion(
+                client,
+                "openai",
                 model="gpt-4o",
                 response_format={"type": "json_object"},
                 messages=[
@@ -97,6 +106,7 @@ CRITICAL: Replace every placeholder below with REAL data extracted from the narr
 # ==============================================================================
 # LEVEL 2: LEGAL CLASSIFICATION (The "Definitional" Layer)
 # ==============================================================================
+@traced("cucp.level_2")
 def run_level_2_classification(facts: list, combined_financials: str = "", staged_precedents: list = None) -> dict:
     level_2_precedents = get_precedents(2)
     if staged_precedents:
@@ -130,7 +140,9 @@ Return valid JSON mapping each input fact ID to a classification.
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
+            "openai",
             model="gpt-4o",
             response_format={"type": "json_object"},
             messages=[
@@ -143,7 +155,9 @@ Return valid JSON mapping each input fact ID to a classification.
         try:
             return json.loads(response.choices[0].message.content)
         except json.JSONDecodeError:
-            retry = client.chat.completions.create(
+            retry = chat_completion(
+                client,
+                "openai",
                 model="gpt-4o",
                 response_format={"type": "json_object"},
                 messages=[
@@ -159,6 +173,7 @@ Return valid JSON mapping each input fact ID to a classification.
 # ==============================================================================
 # LEVEL 3: EVIDENTIARY THRESHOLD (The "Magnitude" Layer)
 # ==============================================================================
+@traced("cucp.level_3")
 def run_level_3_thresholds(classifications: list, facts: list, pnw_result: str, staged_precedents: list = None) -> dict:
     level_3_precedents = get_precedents(3)
     if staged_precedents:
@@ -206,7 +221,9 @@ request_info MUST be "Yes" or "No".
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            client,
+            "openai",
             model="gpt-4o",
             response_format={"type": "json_object"},
             messages=[
@@ -219,7 +236,9 @@ request_info MUST be "Yes" or "No".
         try:
             return json.loads(response.choices[0].message.content)
         except json.JSONDecodeError:
-            retry = client.chat.completions.create(
+            retry = chat_completion(
+                client,
+                "openai",
                 model="gpt-4o",
                 response_format={"type": "json_object"},
                 messages=[
@@ -235,6 +254,7 @@ request_info MUST be "Yes" or "No".
 # ==============================================================================
 # REPORT GENERATION
 # ==============================================================================
+@traced("cucp.report")
 def generate_final_md_report(level_1_data: dict, level_3_data: dict) -> str:
     """Takes the approved JSON state and synthesizes the exact markdown format for the UI."""
     current_date = datetime.datetime.now().strftime("%B %d, %Y")
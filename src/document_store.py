@@ -0,0 +1,162 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PyPDF2 import PdfReader
+
+from src.response_cache import document_hash
+from src.ttl_cache import TTLCache
+
+# =====================================================================
+# Shared document store
+# =====================================================================
+# Uploaded documents (and the page text extracted from them) live here once
+# per process, keyed by their content hash, instead of in every session's
+# st.session_state. Sessions keep only the document id. The store is an LRU
+# bounded by total bytes (raw file plus extracted text); an evicted document
+# is simply re-added from the upload widget on the session's next rerun.
+
+DOCUMENT_STORE_MAX_BYTES = int(os.getenv("DOCUMENT_STORE_MAX_MB", "512")) * 2**20
+
+_documents = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Streamlit upload id -> document id, so reruns do not re-hash the same upload
+_upload_ids = TTLCache(maxsize=1024)
+
+
+def _text_size(pages) -> int:
+    return sum(len(page) for page in pages or ())
+
+
+def _trim():
+    # Caller holds _lock
+    size = sum(entry["size"] for entry in _documents.values())
+    while size > DOCUMENT_STORE_MAX_BYTES and _documents:
+        _, entry = _documents.popitem(last=False)
+        size -= entry["size"]
+        _stats["evictions"] += 1
+
+
+def _read_bytes(document) -> bytes:
+    if isinstance(document, bytes):
+        return document
+    if isinstance(document, str):
+        with open(document, "rb") as f:
+            return f.read()
+    document.seek(0)
+    data = document.read()
+    document.seek(0)
+    return data
+
+
+def put_document(document, name: str = None) -> str:
+    """
+    Add a document (bytes, file path or file-like such as an UploadedFile) and
+    return its id, the same content hash the response cache uses.
+    """
+    upload_id = getattr(document, "file_id", None)
+    doc_id = _upload_ids.get(upload_id) if upload_id else None
+    if doc_id is not None:
+        with _lock:
+            if doc_id in _documents:
+                _documents.move_to_end(doc_id)
+                return doc_id
+
+    data = _read_bytes(document)
+    doc_id = document_hash(data)
+    if upload_id:
+        _upload_ids.set(upload_id, doc_id)
+    name = name or getattr(document, "name", None) or (document if isinstance(document, str) else None)
+    with _lock:
+        if doc_id in _documents:
+            _documents.move_to_end(doc_id)
+        elif len(data) <= DOCUMENT_STORE_MAX_BYTES:
+            _documents[doc_id] = {
+                "name": os.path.basename(name) if name else None,
+                "data": data,
+                "pages": None,
+                "size": len(data),
+            }
+            _trim()
+    return doc_id
+
+
+def _get(doc_id):
+    with _lock:
+        entry = _documents.get(doc_id)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _documents.move_to_end(doc_id)
+        _stats["hits"] += 1
+        return entry
+
+
+def get_bytes(doc_id: str):
+    """Raw file content, or None if the document is not (or no longer) stored."""
+    entry = _get(doc_id)
+    return entry["data"] if entry else None
+
+
+def open_document(doc_id: str):
+    """The stored file as a named file-like object, or None if it was evicted."""
+    entry = _get(doc_id)
+    if entry is None:
+        return None
+    file = io.BytesIO(entry["data"])
+    file.name = entry["name"] or f"{doc_id}.pdf"
+    return file
+
+
+def extract_pages(data: bytes) -> list:
+    """Text of every page of a PDF ("" for pages without a text layer)."""
+    return [page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages]
+
+
+def get_pages(doc_id: str):
+    """
+    Page texts of a stored PDF, extracted on first use and kept with the
+    document, or None if it is not stored.
+    """
+    entry = _get(doc_id)
+    if entry is None:
+        return None
+    pages = entry["pages"]
+    if pages is None:
+        # Extract outside the lock; if two sessions race on a new upload both
+        # parse it and the first result is kept
+        pages = extract_pages(entry["data"])
+        with _lock:
+            if _documents.get(doc_id) is entry and entry["pages"] is None:
+                entry["pages"] = pages
+                entry["size"] += _text_size(pages)
+                _trim()
+    return pages
+
+
+def document_pages(document, name: str = None):
+    """(doc_id, page texts) for a document, adding it to the store if needed."""
+    doc_id = put_document(document, name)
+    pages = get_pages(doc_id)
+    if pages is None:
+        # Larger than the whole store: parse it without keeping it
+        pages = extract_pages(_read_bytes(document))
+    return doc_id, pages
+
+
+def get_document_store_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "documents": len(_documents),
+            "bytes": sum(entry["size"] for entry in _documents.values()),
+            "max_bytes": DOCUMENT_STORE_MAX_BYTES,
+        }
+
+
+def clear_documents():
+    with _lock:
+        _documents.clear()
+    _upload_ids.clear()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# =====================================================================
+# Persisted DeepEval results
+# =====================================================================
+# Every metric score is stored in a local SQLite file keyed by
+#   (question, answer hash, context hash, metric, metric config, judge model)
+# so re-evaluating an unchanged answer never calls the judge again. The
+# metric config is a fingerprint of the metric's threshold / steps /
+# parameters: editing one metric's definition re-scores only that metric,
+# and a different answer or document re-scores only the affected cases.
+# Failed measurements are not stored, so they are retried next time.
+
+EVAL_STORE_ENABLED = os.getenv("EVAL_STORE_ENABLED", "true").lower() == "true"
+EVAL_STORE_PATH = os.getenv(
+    "EVAL_STORE_PATH", os.path.join(os.path.dirname(__file__), "eval_results.db")
+)
+
+# Metric attributes that change what a score means
+METRIC_CONFIG_FIELDS = (
+    "threshold",
+    "strict_mode",
+    "include_reason",
+    "criteria",
+    "evaluation_steps",
+    "evaluation_params",
+)
+
+_lock = threading.Lock()
+_initialized = False
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS eval_results (
+    question      TEXT NOT NULL,
+    answer_hash   TEXT NOT NULL,
+    context_hash  TEXT NOT NULL,
+    metric        TEXT NOT NULL,
+    metric_config TEXT NOT NULL,
+    judge_model   TEXT NOT NULL,
+    score         REAL,
+    reason        TEXT,
+    passed        INTEGER,
+    seconds       REAL,
+    created_at    REAL,
+    PRIMARY KEY (question, answer_hash, context_hash, metric, metric_config, judge_model)
+)
+"""
+
+
+def _hash(value) -> str:
+    data = json.dumps(value, default=str, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _connect():
+    global _initialized
+    conn = sqlite3.connect(EVAL_STORE_PATH, timeout=30)
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(_SCHEMA)
+                conn.commit()
+                _initialized = True
+    return conn
+
+
+@contextmanager
+def _connection():
+    """A committed-on-success connection that is always closed."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def metric_config(metric) -> str:
+    """Fingerprint of the settings that define a metric (not its last score)."""
+    config = {"class": type(metric).__name__}
+    for field in METRIC_CONFIG_FIELDS:
+        value = getattr(metric, field, None)
+        if isinstance(value, (list, tuple)):
+            value = [getattr(v, "value", v) for v in value]  # LLMTestCaseParams enums
+        if value is not None:
+            config[field] = value
+    return _hash(config)[:16]
+
+
+def judge_model(metric) -> str:
+    model = getattr(metric, "evaluation_model", None) or getattr(metric, "model", None)
+    return str(getattr(model, "name", None) or model or "deepeval")
+
+
+def result_key(test_case, name, metric) -> tuple:
+    """Store key of one metric on one test case."""
+    context = [
+        getattr(test_case, "retrieval_context", None),
+        getattr(test_case, "context", None),
+        getattr(test_case, "expected_output", None),
+    ]
+    return (
+        test_case.input,
+        _hash(test_case.actual_output),
+        _hash(context),
+        name,
+        metric_config(metric),
+        judge_model(metric),
+    )
+
+
+def get_result(key):
+    """Stored {"score", "reason", "passed", "seconds"} for key, or None."""
+    if not EVAL_STORE_ENABLED:
+        return None
+    try:
+        with _connection() as conn:
+            row = conn.execute(
+                "SELECT score, reason, passed, seconds FROM eval_results "
+                "WHERE question = ? AND answer_hash = ? AND context_hash = ? "
+                "AND metric = ? AND metric_config = ? AND judge_model = ?",
+                key,
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Eval store read failed: {e}")
+        return None
+    if row is None:
+        return None
+    score, reason, passed, seconds = row
+    return {"score": score, "reason": reason, "passed": bool(passed), "seconds": seconds}
+
+
+def save_result(key, result: dict):
+    if not EVAL_STORE_ENABLED:
+        return
+    try:
+        with _connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO eval_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    result["score"],
+                    str(result.get("reason", "")),
+                    int(bool(result.get("passed"))),
+                    result.get("seconds"),
+                    time.time(),
+                ),
+            )
+    except sqlite3.Error as e:
+        print(f"Eval store write failed: {e}")
+
+
+def result_counts() -> dict:
+    """Number of stored scores per metric name."""
+    if not EVAL_STORE_ENABLED:
+        return {}
+    try:
+        with _connection() as conn:
+            rows = conn.execute(
+                "SELECT metric, COUNT(*) FROM eval_results GROUP BY metric ORDER BY metric"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Eval store read failed: {e}")
+        return {}
+    return dict(rows)
+
+
+def clear_results(metric: str = None) -> bool:
+    """Forget stored scores, for one metric name or all of them. Returns False on failure."""
+    if not EVAL_STORE_ENABLED:
+        return False
+    try:
+        with _connection() as conn:
+            if metric is None:
+                conn.execute("DELETE FROM eval_results")
+            else:
+                conn.execute("DELETE FROM eval_results WHERE metric = ?", (metric,))
+    except sqlite3.Error as e:
+        print(f"Eval store write failed: {e}")
+        return False
+    return True
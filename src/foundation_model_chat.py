@@ -1,8 +1,184 @@
 # src/foundation_model_chat.py
 
+import json
+import os
+import re
+
 import streamlit as st
 from openai import OpenAI, AuthenticationError, APIError
 
+from src.llm_scheduler import BATCH, chat_completion
+from src.llm_telemetry import record_cache_hit
+
+
+FOUNDATION_MODEL = "gpt-4"
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# ----- Fixed answers -----
+# Questions about PITMA and CPOC have verbatim answers. They are kept in a
+# JSON table (FOUNDATION_ANSWERS_FILE overrides the bundled one) that both the
+# local matcher and the system prompt are built from.
+ANSWERS_FILE = os.getenv(
+    "FOUNDATION_ANSWERS_FILE",
+    os.path.join(os.path.dirname(__file__), "foundation_answers.json"),
+)
+
+
+def load_answer_table(path: str = ANSWERS_FILE) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Could not load foundation answers from {path}: {e}")
+        return {"answers": []}
+
+
+ANSWER_TABLE = load_answer_table()
+
+
+def _normalize_question(text: str) -> str:
+    return " " + " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split()) + " "
+
+
+def match_canned_answer(user_input: str, table: dict = ANSWER_TABLE):
+    """
+    Fixed answer for a short question about one of the table's topics, else None.
+
+    Every term group of an entry must have at least one whole-word hit; entries
+    are tried in file order, so more specific ones come first. Only definitional
+    or list phrasings are answered ("what is PITMA", "list the chiefs"): a word
+    that is neither a matched term nor a filler word ("hiring", "belong", "AB
+    109") means the question asks for more than the fixed text and goes to the
+    model, as do long questions and ones with open-question terms ("how", ...).
+    """
+    question = _normalize_question(user_input)
+    if len(question.split()) > table.get("max_words", 12):
+        return None
+    if any(f" {term} " in question for term in table.get("open_question_terms", [])):
+        return None
+    filler = set(table.get("filler_words", []))
+    for entry in table.get("answers", []):
+        hits = [
+            [term for term in group if f" {term} " in question] for group in entry["match"]
+        ]
+        if not all(hits):
+            continue
+        rest = question
+        for term in sorted((t for group in hits for t in group), key=len, reverse=True):
+            rest = rest.replace(f" {term} ", " ")
+        if set(rest.split()) <= filler:
+            return entry["answer"]
+    return None
+
+
+def build_system_prompt(table: dict = ANSWER_TABLE) -> str:
+    prompt = (
+        "You are a helpful assistant that answers questions factually and concisely "
+        "about California probation associations, officers, and general knowledge.\n\n"
+    )
+    for entry in table.get("answers", []):
+        prompt += f"If the user asks {entry['asks']}, respond with:\n'{entry['answer']}'\n\n"
+    return prompt
+
+
+# Built once from the answer table. It is far below the 1024-token minimum
+# for OpenAI prompt caching, so the per-call saving comes from compact_history
+# sending a summary instead of the full conversation.
+FOUNDATION_SYSTEM_PROMPT = build_system_prompt()
+
+# ----- Conversation memory -----
+# Recent turns are sent verbatim up to CONTEXT_TOKEN_BUDGET; once the window
+# grows past it, the oldest turns are folded into a running summary that is
+# sent right after the system prompt.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("FOUNDATION_CONTEXT_TOKENS", "3000"))
+# Turns shown by default; older ones are rendered only when asked for.
+HISTORY_RENDER_LIMIT = 10
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def _turn_tokens(turn) -> int:
+    question, answer = turn
+    return estimate_tokens(question) + estimate_tokens(answer)
+
+
+def build_messages(history, summary, summarized_upto, user_input):
+    """System prompt, summary of older turns, the recent window, then the new question."""
+    messages = [{"role": "system", "content": FOUNDATION_SYSTEM_PROMPT}]
+    if summary:
+        messages.append(
+            {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+        )
+    for question, answer in history[summarized_upto:]:
+        messages.append({"role": "user", "content": question})
+        messages.append({"role": "assistant", "content": answer})
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+
+def summarize_turns(client, summary, turns) -> str:
+    """Fold turns into the running summary with a small, cheap model."""
+    transcript = "\n\n".join(f"User: {q}\nAssistant: {a}" for q, a in turns)
+    # Housekeeping, so it yields to users' own requests
+    completion = chat_completion(
+        client,
+        "openai",
+        priority=BATCH,
+        model=SUMMARY_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "Maintain a compact summary of a conversation. Keep names, facts, "
+                    "links and open questions the user may refer back to. "
+                    "Reply with the updated summary only, under 200 words."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}",
+            },
+        ],
+        temperature=0,
+    )
+    return completion.choices[0].message.content.strip()
+
+
+def compact_history(client, history, summary, summarized_upto):
+    """
+    Keep the verbatim window within CONTEXT_TOKEN_BUDGET.
+
+    When it overflows, the oldest turns are summarized until the window is back
+    under half the budget, so a summary call happens every few turns rather
+    than on every one. Returns the new (summary, summarized_upto).
+    """
+    window = history[summarized_upto:]
+    if sum(_turn_tokens(turn) for turn in window) <= CONTEXT_TOKEN_BUDGET:
+        return summary, summarized_upto
+
+    fold = 0
+    remaining = sum(_turn_tokens(turn) for turn in window)
+    # Always keep the latest turn verbatim
+    while fold < len(window) - 1 and remaining > CONTEXT_TOKEN_BUDGET // 2:
+        remaining -= _turn_tokens(window[fold])
+        fold += 1
+
+    try:
+        summary = summarize_turns(client, summary, window[:fold])
+    except Exception as e:
+        # Without a summary the oldest turns are simply dropped from the context.
+        print(f"Conversation summary failed: {e}")
+    return summary, summarized_upto + fold
+
+
+def _render_turns(turns):
+    for q, a in turns:
+        st.write(f"*Q:* {q}")
+        st.write(f"*A:* {a}")
+
 
 def foundation_model_chat_ui():
     col1, col2, col3 = st.columns([1, 7, 1])
@@ -17,41 +193,47 @@ def foundation_model_chat_ui():
         # Store chat history in session
         if "foundation_history" not in st.session_state:
             st.session_state.foundation_history = []
+        st.session_state.setdefault("foundation_summary", "")
+        st.session_state.setdefault("foundation_summarized_upto", 0)
 
         # Input field
         user_input = st.text_input("Enter your prompt:")
 
         # Button to submit
         if st.button("Interact with the LLM", key="foundation_ask"):
-            if user_input.strip():
+            canned_answer = match_canned_answer(user_input)
+            if canned_answer:
+                record_cache_hit("canned_answer")
+                st.session_state.foundation_history.append((user_input, canned_answer))
+            elif user_input.strip():
                 with st.spinner("Generating response..."):
                     try:
                         # Initialize client here to prevent crash on import if key is missing/invalid
                         client = OpenAI()
                         
-                        completion = client.chat.completions.create(
-                            model="gpt-4",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": (
-                                        "You are a helpful assistant that answers questions factually and concisely "
-                                        "about California probation associations, officers, and general knowledge.\n\n"
-                                        "If the user asks about PITMA, respond with:\n"
-                                        "'The Probation Information Technology Managers Association (PITMA), along with the Probation Business Managers Association (PBMA), supports California’s Chief Probation Officers and county probation departments. They provide a platform for professionals to collaborate and solve fiscal, IT, and administrative challenges in criminal and juvenile justice.'\n\n"
-                                        "If the user asks about the website of PITMA, respond with:\n"
-                                        "'The official website of PITMA (Probation and Pretrial Managers Association) is https://pbma-pitma.memberclicks.net/'\n\n"
-                                        "If the user asks about the Chief Probation Officers of California, respond with:\n"
-                                        "'The Chief Probation Officers of California (CPOC) is an association of all 58 counties' probation chiefs. CPOC promotes a research-based approach to public safety, rehabilitation, and community corrections. Their work spans client accountability, victim restoration, and policy leadership in juvenile and adult justice.'\n\n"
-                                        "If the user asks to list Chief Probation Officers in California, reply with:\n"
-                                        "'You can view the full list of California Chief Probation Officers at: https://www.cpoc.org/all-chiefs'\n"
-                                    ),
-                                },
-                                {"role": "user", "content": user_input},
-                            ],
+                        completion = chat_completion(
+                            client,
+                            "openai",
+                            model=FOUNDATION_MODEL,
+                            messages=build_messages(
+                                st.session_state.foundation_history,
+                                st.session_state.foundation_summary,
+                                st.session_state.foundation_summarized_upto,
+                                user_input,
+                            ),
                         )
                         response = completion.choices[0].message.content
                         st.session_state.foundation_history.append((user_input, response))
+
+                        (
+                            st.session_state.foundation_summary,
+                            st.session_state.foundation_summarized_upto,
+                        ) = compact_history(
+                            client,
+                            st.session_state.foundation_history,
+                            st.session_state.foundation_summary,
+                            st.session_state.foundation_summarized_upto,
+                        )
                     
                     except AuthenticationError:
                         st.error("Authentication Error: The OpenAI API key provided is invalid or does not have access to the requested project/model. Please check your .env file.")
@@ -66,6 +248,8 @@ def foundation_model_chat_ui():
         # Display chat history
         if st.session_state.foundation_history:
             st.markdown("### Conversation History")
-            for q, a in st.session_state.foundation_history:
-                st.write(f"*Q:* {q}")
-                st.write(f"*A:* {a}")
+            history = st.session_state.foundation_history
+            older = history[:-HISTORY_RENDER_LIMIT]
+            if older and st.toggle(f"Show {len(older)} earlier messages", key="foundation_show_older"):
+                _render_turns(older)
+            _render_turns(history[-HISTORY_RENDER_LIMIT:])
@@ -1,10 +1,19 @@
+import hashlib
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
 
 import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from groq import Groq
+from requests.adapters import HTTPAdapter
+
+from src.llm_scheduler import BATCH, INTERACTIVE, chat_completion
+from src.llm_telemetry import bind_use_case, record_cache_hit, use_case
+from src.ttl_cache import TTLCache
 
 load_dotenv()
 
@@ -15,64 +24,391 @@ client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
 
 # ======================================
-# 1. Fetch Caltrans highway page (same)
+# 1. Fetch Caltrans highway page (cached)
 # ======================================
-BASE_ROAD_URL = "https://roads.dot.ca.gov/"
-
-
-def fetch_caltrans_page(highway_number: str) -> str:
-    params = {"roadnumber": highway_number}
-    resp = requests.get(BASE_ROAD_URL, params=params)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    return soup.get_text(separator="\n")
+# CALTRANS_ROAD_URL lets a local stub server (benchmarks/caltrans_stub_server.py)
+# stand in for roads.dot.ca.gov.
+BASE_ROAD_URL = os.getenv("CALTRANS_ROAD_URL", "https://roads.dot.ca.gov/")
+
+# Seconds a fetched page is served from memory before we revalidate it.
+PAGE_CACHE_TTL = float(os.getenv("CALTRANS_PAGE_TTL", "300"))
+# (connect, read) timeouts for roads.dot.ca.gov.
+FETCH_TIMEOUT = (5, 15)
+
+# One pooled session per process so repeated lookups reuse TCP/TLS connections.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# highway number -> {"html", "incident_text", "records", "etag", "last_modified",
+#                    "fetched_at"}
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+# highway number -> lock held while that page is being fetched, so concurrent
+# lookups for the same highway wait for one request instead of each sending one.
+_page_fetch_locks = {}
+
+
+def _page_is_fresh(entry) -> bool:
+    return entry is not None and time.monotonic() - entry["fetched_at"] < PAGE_CACHE_TTL
+
+
+def _get_page_entry(highway_number: str, force_refresh: bool = False) -> dict:
+    """
+    Return the cached page entry for a highway, fetching it if needed.
+
+    Pages are kept in memory for PAGE_CACHE_TTL seconds. Once stale (or when
+    force_refresh is set) the page is revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged report costs a 304 and no re-parse.
+    The incident section is extracted (and parsed into records) once per new
+    page body.
+    """
+    requested_at = time.monotonic()
+    with _page_cache_lock:
+        entry = _page_cache.get(highway_number)
+        if not force_refresh and _page_is_fresh(entry):
+            return entry
+        fetch_lock = _page_fetch_locks.setdefault(highway_number, threading.Lock())
+
+    with fetch_lock:
+        # Another thread may have fetched the page while we were waiting.
+        with _page_cache_lock:
+            entry = _page_cache.get(highway_number)
+        if entry is not None:
+            if force_refresh and entry["fetched_at"] >= requested_at:
+                return entry
+            if not force_refresh and _page_is_fresh(entry):
+                return entry
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        started = time.monotonic()
+        resp = _session.get(
+            BASE_ROAD_URL,
+            params={"roadnumber": highway_number},
+            headers=headers,
+            timeout=FETCH_TIMEOUT,
+        )
+
+        if resp.status_code == 304 and entry is not None:
+            html, incident_text = entry["html"], entry["incident_text"]
+            records = entry["records"]
+        else:
+            resp.raise_for_status()
+            html = resp.text
+            incident_text = extract_incident_text_from_html(html)
+            records = parse_incident_records(incident_text, highway_number)
+
+        new_entry = {
+            "html": html,
+            "incident_text": incident_text,
+            "records": records,
+            "etag": resp.headers.get("ETag") or (entry or {}).get("etag"),
+            "last_modified": resp.headers.get("Last-Modified")
+            or (entry or {}).get("last_modified"),
+            "fetched_at": started,
+        }
+        with _page_cache_lock:
+            _page_cache[highway_number] = new_entry
+        return new_entry
+
+
+def fetch_caltrans_page(highway_number: str, force_refresh: bool = False) -> str:
+    """Return the full text of the (cached) Caltrans page for a highway."""
+    return html_to_text(_get_page_entry(highway_number, force_refresh)["html"])
+
+
+def fetch_incident_text(highway_number: str, force_refresh: bool = False) -> str:
+    """Return the extracted incident section for a highway, from the page cache."""
+    return _get_page_entry(highway_number, force_refresh)["incident_text"]
+
+
+def fetch_incident_records(highway_number: str, force_refresh: bool = False) -> list:
+    """Return the structured incident records for a highway, from the page cache."""
+    return _get_page_entry(highway_number, force_refresh)["records"]
 
 
 # ============================================================
-# 2. Extract incident section from raw Caltrans HTML (same)
+# 2. Extract incident section from raw Caltrans HTML
 # ============================================================
-def extract_incident_text(raw_text: str) -> str:
-    lines = [l.strip() for l in raw_text.splitlines() if l.strip()]
-
-    capturing = False
-    output = []
-
-    for line in lines:
+# Lines containing any of these are navigation/footer chrome, not incidents.
+BAD_LINE_MARKERS = [
+    "ENTER HIGHWAY NUMBER",
+    "CHECK CURRENT",
+    "MAPS",
+    "QUICKMAP",
+    "CONTACT US",
+    "ACCESSIBILITY",
+    "PRIVACY POLICY",
+    "CONDITIONS OF USE",
+    "BACK TO TOP",
+    "KNOW BEFORE YOU GO",
+]
+BAD_LINE_PATTERN = re.compile("|".join(re.escape(b) for b in BAD_LINE_MARKERS))
+FOOTER_PATTERN = re.compile("CONDITIONS OF USE|PRIVACY POLICY")
+
+# Elements whose text BeautifulSoup's get_text() leaves out.
+_SKIPPED_TAGS = {"script", "style", "template"}
+# HTML is fed to the streaming parser in slices so it can stop at the footer.
+_FEED_CHUNK = 16384
+
+
+class _IncidentCollector:
+    """Line-by-line state machine shared by the text and HTML extractors."""
+
+    def __init__(self):
+        self.capturing = False
+        self.done = False
+        self.lines = []
+
+    def add(self, line: str):
         upper = line.upper()
 
-        if upper.startswith("[IN THE") and "AREA" in upper:
-            capturing = True
+        if not self.capturing and upper.startswith("[IN THE") and "AREA" in upper:
+            self.capturing = True
+
+        if self.capturing and not BAD_LINE_PATTERN.search(upper):
+            self.lines.append(line)
+
+        if FOOTER_PATTERN.search(upper):
+            self.done = True
+
+
+class _PageTextParser(HTMLParser):
+    """
+    Tokenizes Caltrans HTML and hands each stripped text line to a callback,
+    in the same order and with the same line breaks as get_text("\n").
+    """
+
+    def __init__(self, on_line):
+        super().__init__(convert_charrefs=True)
+        self.on_line = on_line
+        self._skip_depth = 0
+        self._pending = []
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                self.on_line(line)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in _SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._pending.append(data)
+
+    def unknown_decl(self, data):
+        if data.startswith("CDATA[") and not self._skip_depth:
+            self._pending.append(data[len("CDATA[") :])
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_to_text(html: str) -> str:
+    """Flatten a page to newline-separated text without building a tree."""
+    lines = []
+    parser = _PageTextParser(lines.append)
+    parser.feed(html)
+    parser.close()
+    return "\n".join(lines)
+
+
+def extract_incident_text_from_html(html: str) -> str:
+    """
+    Single-pass incident extraction straight from the page HTML.
+
+    Starts capturing at the "[IN THE ... AREA" marker while tokenizing and
+    stops feeding the parser once the footer is reached. Produces the same
+    output as extract_incident_text(BeautifulSoup(html).get_text("\n")).
+    """
+    collector = _IncidentCollector()
+
+    def on_line(line):
+        if not collector.done:
+            collector.add(line)
+
+    parser = _PageTextParser(on_line)
+    for start in range(0, len(html), _FEED_CHUNK):
+        parser.feed(html[start : start + _FEED_CHUNK])
+        if collector.done:
+            break
+    else:
+        parser.close()
+    return "\n".join(collector.lines)
 
-        if capturing:
-            output.append(line)
 
-        if "CONDITIONS OF USE" in upper or "PRIVACY POLICY" in upper:
+def extract_incident_text(raw_text: str) -> str:
+    collector = _IncidentCollector()
+
+    for line in raw_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        collector.add(line)
+        if collector.done:
             break
 
-    bad = [
-        "ENTER HIGHWAY NUMBER",
-        "CHECK CURRENT",
-        "MAPS",
-        "QUICKMAP",
-        "CONTACT US",
-        "ACCESSIBILITY",
-        "PRIVACY POLICY",
-        "CONDITIONS OF USE",
-        "BACK TO TOP",
-        "KNOW BEFORE YOU GO",
-    ]
+    return "\n".join(collector.lines)
 
-    clean = [l for l in output if not any(b in l.upper() for b in bad)]
-    return "\n".join(clean)
+
+# ============================================================
+# 2b. Parse incident section into structured records
+# ============================================================
+AREA_PATTERN = re.compile(r"^\[IN THE (.+?)\]$")
+DIRECTION_PATTERN = re.compile(r"\b(NORTH|SOUTH|EAST|WEST)BOUND\b")
+TIME_WINDOW_PATTERN = re.compile(
+    r"\b(?:(?:(?:MON|TUE|WED|THU|FRI|SAT|SUN)\w*(?: THRU (?:MON|TUE|WED|THU|FRI|SAT|SUN)\w*)?|DAILY) )?"
+    r"FROM \d{1,2}(?::\d{2})? ?[AP]M TO \d{1,2}(?::\d{2})? ?[AP]M\b"
+)
+LOCATION_PATTERN = re.compile(
+    r"\b((?:FROM|AT|NEAR|IN(?! EFFECT)) .+?)(?: (?:IS|ARE) CLOSED\b.*?)?(?= - |$)"
+)
+
+# (condition type, pattern) checked in order; the first match wins.
+CONDITION_RULES = [
+    ("none", re.compile(r"NO TRAFFIC RESTRICTIONS")),
+    # R1 "CHAINS OR SNOW TIRES ARE REQUIRED", R2/R3 "CHAINS ARE REQUIRED ON ALL
+    # VEHICLES ...", "CHAIN CONTROLS", "R2 CHAIN CONTROL"; never "CHAINS ARE NOT REQUIRED"
+    ("chain_control", re.compile(
+        r"\b(?:CHAINS?|SNOW TIRES)\b(?:(?!\bNOT\b)[^.]){0,40}?\bREQUIRED\b"
+        r"|\bCHAIN CONTROLS?\b|\bR-?[123] (?:CHAIN|CONTROL|CONDITION)"
+    )),
+    ("ramp_closure", re.compile(
+        r"\b(?:ON|OFF|CONNECTOR)-?RAMPS? (?:FROM|TO|AT)?.*\bCLOSED\b"
+        r"|\bCONNECTORS? (?:FROM|TO|AT)\b.*\b(?:IS|ARE) CLOSED\b"
+    )),
+    ("lane_closure", re.compile(r"\bLANES? (?:IS|ARE) CLOSED\b")),
+    ("closure", re.compile(r"\bCLOSED\b")),
+    ("one_way_traffic", re.compile(r"1-WAY TRAFFIC CONTROL|ONE-WAY TRAFFIC")),
+    ("traffic_hold", re.compile(r"\bBEING HELD\b|\bHOLDS?\b")),
+]
+
+
+def _parse_incident_line(line: str, highway_number: str, area: str) -> dict:
+    upper = line.upper()
+
+    condition = "advisory"
+    for name, pattern in CONDITION_RULES:
+        if pattern.search(upper):
+            condition = name
+            break
+    # "THE EASTBOUND LANES ARE CLOSED" shuts the whole direction, not one lane.
+    if condition == "lane_closure" and re.search(r"\b(?:ALL|THE \w+BOUND) LANES ARE CLOSED", upper):
+        condition = "closure"
+
+    direction = DIRECTION_PATTERN.search(upper)
+    time_window = TIME_WINDOW_PATTERN.search(upper)
+
+    body = upper.replace("/CONSTRUCTION/", " ")
+    if time_window:
+        body = body.replace(time_window.group(0), " ")
+    body = " ".join(body.split())
+    location = LOCATION_PATTERN.search(body)
+    reason = body.split(" - ", 1)[1] if " - " in body else ""
+
+    return {
+        "highway": highway_number,
+        "area": area,
+        "direction": f"{direction.group(1)}BOUND" if direction else "BOTH",
+        "location": location.group(1).strip() if location else "",
+        "condition": condition,
+        "construction": "CONSTRUCTION" in upper,
+        "time_window": time_window.group(0) if time_window else "",
+        "reason": reason.strip(),
+        "text": line,
+    }
+
+
+def parse_incident_records(incident_text: str, highway_number: str = "") -> list:
+    """
+    Turn the extracted incident section into one record per reported segment:
+    highway, area, direction, location, condition type (closure, lane_closure,
+    ramp_closure, chain_control, one_way_traffic, traffic_hold, advisory or
+    none), construction flag, time window, reason and the original line.
+    """
+    records = []
+    area = ""
+    for line in incident_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        area_match = AREA_PATTERN.match(line.upper())
+        if area_match:
+            area = area_match.group(1).strip()
+            continue
+        if not area:
+            continue
+        records.append(_parse_incident_line(line, highway_number, area))
+    return records
 
 
 # =====================================================
-# 3. Extract highway number from prompt (same logic)
+# 3. Extract highway numbers from prompt
 # =====================================================
+ROUTE_PREFIX = r"(?:INTERSTATE|I|US|SR|CA|HWY|HIGHWAYS?|ROUTES?)[-\s]?"
+# Numbers joined to a route by "and" / "or" / commas ("I-80, 50 and 99").
+ROUTE_LIST_TAIL = (
+    r"((?:(?:\s*[,&]\s*(?:(?:AND|OR)\s+)?|\s+(?:AND|OR)\s+)(?:" + ROUTE_PREFIX + r")?\d{1,3}\b)*)"
+)
+# Numbers written with a route prefix ("I-80", "US 50", "SR-99", "Highway 1").
+ROUTE_PATTERN = re.compile(r"\b" + ROUTE_PREFIX + r"(\d{1,3})\b" + ROUTE_LIST_TAIL)
+# Original catch-all for prompts without a prefix: the first 1-3 digit number.
+NUMBER_PATTERN = re.compile(r"\b(\d{1,3})\b" + ROUTE_LIST_TAIL)
+LIST_NUMBER_PATTERN = re.compile(r"\d{1,3}")
+# Upper bound on routes looked up for a single prompt.
+MAX_HIGHWAYS_PER_PROMPT = 6
+
+
+def extract_highways_from_prompt(user_prompt: str) -> list:
+    """
+    Return every highway number mentioned in the prompt, in order.
+
+    Route-prefixed numbers and the numbers listed with them ("route 1 and
+    101") are routes. Without a prefix only the first bare number (and its
+    list) is, so "Is 80 closed for the next 2 hours?" looks up 80 alone.
+    Defaults to I-5 like the single-route lookup.
+    """
+    upper = user_prompt.upper()
+    matches = ROUTE_PATTERN.findall(upper)
+    if not matches:
+        first = NUMBER_PATTERN.search(upper)
+        matches = [first.groups()] if first else []
+
+    numbers = []
+    for number, tail in matches:
+        numbers.append(number)
+        numbers.extend(LIST_NUMBER_PATTERN.findall(tail))
+
+    highways = []
+    for number in numbers:
+        number = number.lstrip("0") or "0"
+        if number not in highways:
+            highways.append(number)
+    return highways[:MAX_HIGHWAYS_PER_PROMPT] or ["5"]  # Default to I-5
+
+
 def extract_highway_from_prompt(user_prompt: str) -> str:
-    pattern = r"\b(?:I[-\s]?|SR[-\s]?|HWY[-\s]?|HIGHWAY[-\s]?)*(\d{1,3})\b"
-    m = re.search(pattern, user_prompt.upper())
-    return m.group(1) if m else "5"  # Default to I-5
+    return extract_highways_from_prompt(user_prompt)[0]
 
 
 # =====================================================
@@ -88,10 +424,108 @@ def normalize_bullets(text: str) -> str:
     return "\n".join(bullets)
 
 
+# =====================================================
+# 4b. Answer common questions from structured records
+# =====================================================
+# Question intents that records can answer without the LLM, checked in order.
+INTENT_RULES = [
+    ("chain_control", re.compile(r"\bCHAINS?\b|CHAIN CONTROL")),
+    ("construction", re.compile(r"CONSTRUCTION|ROAD ?WORK|WORK ZONE")),
+    ("closure", re.compile(r"\bCLOSED\b|\bCLOSURES?\b|\bCLOSING\b|\bOPEN\b|\bSHUT\b")),
+]
+
+
+def _describe_record(record: dict) -> str:
+    parts = [f"[{record['area'].title()}]"]
+    if record["direction"] != "BOTH":
+        parts.append(record["direction"].title())
+    parts.append(record["location"] or record["text"])
+    if record["time_window"]:
+        parts.append(f"({record['time_window']})")
+    if record["reason"]:
+        parts.append(f"— {record['reason']}")
+    return "- " + " ".join(parts)
+
+
+def answer_from_records(user_prompt: str, highway_number: str, records: list):
+    """
+    Answer closure / chain control / construction questions directly from the
+    parsed records. Returns None when the question needs a free-form summary
+    (or there is nothing parsed to answer from), so the caller falls back to
+    the LLM.
+    """
+    if not records:
+        return None
+
+    upper = user_prompt.upper()
+    intent = next((name for name, pattern in INTENT_RULES if pattern.search(upper)), None)
+    if intent is None:
+        return None
+
+    if intent == "chain_control":
+        matches = [r for r in records if r["condition"] == "chain_control"]
+        if not matches:
+            return f"No chain controls are currently reported on highway {highway_number}."
+        lines = [f"Chain controls are in effect on highway {highway_number}:"]
+
+    elif intent == "construction":
+        matches = [r for r in records if r["construction"]]
+        if not matches:
+            return f"No construction work is currently reported on highway {highway_number}."
+        lines = [f"Construction work is reported on highway {highway_number}:"]
+
+    else:
+        full = [r for r in records if r["condition"] == "closure"]
+        partial = [r for r in records if r["condition"] in ("lane_closure", "ramp_closure")]
+        if not full and not partial:
+            return f"No closures are currently reported on highway {highway_number}."
+        if full:
+            lines = [f"Highway {highway_number} has closures reported:"]
+            lines += [_describe_record(r) for r in full]
+            matches = partial
+            if partial:
+                lines.append("\nLane and ramp closures:")
+        else:
+            lines = [
+                f"Highway {highway_number} is open, with lane or ramp closures:"
+            ]
+            matches = partial
+
+    lines += [_describe_record(r) for r in matches]
+    return "\n".join(lines)
+
+
 # =====================================================
 # 5. Groq Llama-3.1 Summarizer Engine (replacement)
 # =====================================================
-def groq_summarize_incidents(incident_text: str) -> str:
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+
+# Summaries keyed by a hash of the cleaned incident text, so any phrasing of a
+# question about an unchanged report is answered without a Groq round trip.
+_summary_cache = TTLCache(
+    maxsize=256, ttl=float(os.getenv("CALTRANS_SUMMARY_TTL", "3600"))
+)
+
+
+def incident_fingerprint(incident_text: str) -> str:
+    """Hash of the incident text with whitespace and blank lines normalized."""
+    lines = (" ".join(l.split()) for l in incident_text.splitlines())
+    normalized = "\n".join(l for l in lines if l)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def get_summary_cache_stats() -> dict:
+    """Hit/miss counters for the incident summary cache."""
+    return _summary_cache.stats()
+
+
+def groq_summarize_incidents(incident_text: str, priority: str = INTERACTIVE) -> str:
+    cache_key = (SUMMARY_MODEL, incident_fingerprint(incident_text))
+    cached = _summary_cache.get(cache_key)
+    if cached is not None:
+        record_cache_hit("incident_summary", SUMMARY_MODEL)
+        return cached
+
     prompt = f"""
 You are summarizing official Caltrans highway incident reports.
 
@@ -109,28 +543,154 @@ REPORT:
 ----------------
 """
 
-    completion = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
+    completion = chat_completion(
+        client,
+        "groq",
+        priority=priority,
+        model=SUMMARY_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2,
         max_tokens=300,
     )
 
-    return completion.choices[0].message.content
+    summary = completion.choices[0].message.content
+    _summary_cache.set(cache_key, summary)
+    return summary
 
 
 # ============================================================
 # 6. Full final pipeline (equivalent to summarize_caltrans_incidents)
 # ============================================================
-def summarize_caltrans_incidents(user_prompt: str) -> str:
-    highway_number = extract_highway_from_prompt(user_prompt)
+# Shared pool for per-route fetch + summarize work in multi-route prompts.
+_route_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="caltrans-route")
+
+
+def summarize_highway(highway_number: str, user_prompt: str = "") -> str:
+    entry = _get_page_entry(highway_number)
 
-    raw_text = fetch_caltrans_page(highway_number)
+    # Closure / chain / construction questions are answered from the parsed
+    # records; only free-form questions need an LLM summary.
+    structured_answer = answer_from_records(user_prompt, highway_number, entry["records"])
+    if structured_answer is not None:
+        return structured_answer
 
-    incident_text = extract_incident_text(raw_text)
+    incident_text = entry["incident_text"]
 
     raw_summary = groq_summarize_incidents(incident_text)
 
-    clean_summary = normalize_bullets(raw_summary)
+    return normalize_bullets(raw_summary)
+
+
+def _summarize_highway_safe(highway_number: str, user_prompt: str) -> str:
+    try:
+        return summarize_highway(highway_number, user_prompt)
+    except Exception as e:
+        return f"- Could not retrieve conditions for highway {highway_number}: {str(e)}"
+
+
+def summarize_caltrans_incidents(user_prompt: str) -> str:
+    highways = extract_highways_from_prompt(user_prompt)
+
+    if len(highways) == 1:
+        return summarize_highway(highways[0], user_prompt)
+
+    # Fetch, extract and summarize every route at once so a trip question
+    # costs about one round trip instead of one per highway.
+    summaries = _route_executor.map(
+        bind_use_case(_summarize_highway_safe), highways, [user_prompt] * len(highways)
+    )
+
+    sections = [
+        f"**Highway {highway_number}**\n{summary}"
+        for highway_number, summary in zip(highways, summaries)
+    ]
+    return "\n\n".join(sections)
+
+
+# ============================================================
+# 7. Optional background pre-warming for high-traffic highways
+# ============================================================
+# Comma-separated highway numbers kept warm, and seconds between refreshes.
+# The interval should stay below PAGE_CACHE_TTL so interactive lookups for
+# these routes always find a fresh page and a cached summary.
+PREWARM_HIGHWAYS = [
+    h.strip()
+    for h in os.getenv("CALTRANS_PREWARM_HIGHWAYS", "5,80,101,99").split(",")
+    if h.strip()
+]
+PREWARM_INTERVAL = float(os.getenv("CALTRANS_PREWARM_INTERVAL", "120"))
+
+_prewarm_thread = None
+_prewarm_stop = threading.Event()
+# highway number -> {"fingerprint", "changed_at", "refreshed_at"}
+_prewarm_state = {}
+
+
+def prewarm_highway(highway_number: str) -> bool:
+    """
+    Revalidate one highway's page and make sure its summary is cached.
+
+    Returns True when the extracted incident text changed since the last
+    refresh; only then (or when the cached summary has expired) does the
+    refresh cost a Groq call.
+    """
+    incident_text = fetch_incident_text(highway_number, force_refresh=True)
+    fingerprint = incident_fingerprint(incident_text)
+
+    state = _prewarm_state.get(highway_number, {})
+    changed = state.get("fingerprint") != fingerprint
+    groq_summarize_incidents(incident_text, priority=BATCH)
+
+    now = time.time()
+    _prewarm_state[highway_number] = {
+        "fingerprint": fingerprint,
+        "changed_at": now if changed else state.get("changed_at", now),
+        "refreshed_at": now,
+    }
+    return changed
+
+
+def _prewarm_loop(highways, interval):
+    while not _prewarm_stop.is_set():
+        for highway_number in highways:
+            if _prewarm_stop.is_set():
+                break
+            try:
+                with use_case("Caltrans pre-warm"):
+                    changed = prewarm_highway(highway_number)
+                if changed:
+                    print(f"Pre-warm: incident report changed for highway {highway_number}")
+            except Exception as e:
+                print(f"Pre-warm error for highway {highway_number}: {str(e)}")
+        _prewarm_stop.wait(interval)
+
+
+def start_prewarm_poller(highways=None, interval=None):
+    """
+    Start the background pre-warming thread (once per process).
+
+    Safe to call on every Streamlit rerun; later calls are no-ops while the
+    poller is running.
+    """
+    global _prewarm_thread
+    if _prewarm_thread is not None and _prewarm_thread.is_alive():
+        return _prewarm_thread
+
+    _prewarm_stop.clear()
+    _prewarm_thread = threading.Thread(
+        target=_prewarm_loop,
+        args=(highways or PREWARM_HIGHWAYS, interval or PREWARM_INTERVAL),
+        name="caltrans-prewarm",
+        daemon=True,
+    )
+    _prewarm_thread.start()
+    return _prewarm_thread
+
+
+def stop_prewarm_poller():
+    _prewarm_stop.set()
+
 
-    return clean_summary
+def get_prewarm_status() -> dict:
+    """Per-highway refresh/change timestamps from the pre-warming poller."""
+    return dict(_prewarm_state)
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.llm_telemetry import bind_use_case
+
+# =====================================================================
+# Background jobs for long LLM calls
+# =====================================================================
+# The Streamlit script submits work here and polls for the result on later
+# reruns, so a 60-second completion no longer blocks the page and a rerun
+# (widget click, refresh) does not start the same call a second time.
+#
+# The work is network-bound, so a thread pool is enough; jobs and their
+# results live in process memory and are shared by every session. Sessions
+# submitting the same inputs share one job, so each job records its distinct
+# submitters: a job is only cancelled or dropped once none of them still want it.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs nobody collected are dropped after this many seconds.
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs = {}
+_jobs_by_key = {}
+_jobs_lock = threading.Lock()
+
+
+def job_key(*parts) -> str:
+    """Stable dedupe key for a job built from its inputs."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _purge_expired():
+    cutoff = time.time() - JOB_RESULT_TTL
+    for job_id, job in list(_jobs.items()):
+        if job["status"] not in ACTIVE_STATUSES and job["finished_at"] < cutoff:
+            _forget(job_id)
+
+
+def _forget(job_id: str):
+    job = _jobs.pop(job_id, None)
+    if job and _jobs_by_key.get(job["key"]) == job_id:
+        del _jobs_by_key[job["key"]]
+
+
+def _run(job_id: str, fn, args, kwargs):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] != "queued":
+            return
+        job["status"] = "running"
+        job["started_at"] = time.time()
+
+    try:
+        result, error = fn(*args, **kwargs), None
+    except Exception as e:
+        print(f"Job {job['name']} failed: {e}")
+        traceback.print_exc()
+        result, error = None, str(e)
+
+    with _jobs_lock:
+        job["finished_at"] = time.time()
+        # A cancelled job keeps running until the call returns; its result is dropped.
+        if job["status"] == "cancelled":
+            return
+        job["status"] = "failed" if error else "done"
+        job["result"] = result
+        job["error"] = error
+
+
+def submit_job(key: str, fn, *args, name: str = None, submitter: str = None, **kwargs) -> str:
+    """
+    Queue fn(*args, **kwargs) and return its job id.
+
+    If a job with the same key is still queued or running, its id is returned
+    instead of starting a duplicate call, and the job is kept until every
+    submitter has collected or cancelled it. submitter identifies the caller
+    (a Streamlit session); resubmitting from the same submitter is not counted
+    twice. Without one, every call counts as a separate submitter.
+    """
+    submitter = submitter or uuid.uuid4().hex
+    with _jobs_lock:
+        _purge_expired()
+        existing = _jobs_by_key.get(key)
+        if existing and _jobs[existing]["status"] in ACTIVE_STATUSES:
+            _jobs[existing]["waiters"].add(submitter)
+            return existing
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "id": job_id,
+            "key": key,
+            "name": name or getattr(fn, "__name__", "job"),
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "waiters": {submitter},
+        }
+        _jobs_by_key[key] = job_id
+
+    _executor.submit(bind_use_case(_run), job_id, fn, args, kwargs)
+    return job_id
+
+
+def get_job(job_id: str):
+    """Snapshot of a job's state, or None if it is unknown or expired."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job, waiters=set(job["waiters"])) if job else None
+
+
+def cancel_job(job_id: str, submitter: str = None) -> bool:
+    """
+    Withdraw submitter from a queued or running job, and mark the job cancelled
+    once no other submitter is waiting on it (or right away without a submitter).
+    Returns False if the job already finished.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATUSES:
+            return False
+        if submitter is not None:
+            job["waiters"].discard(submitter)
+            if job["waiters"]:
+                return True
+        job["status"] = "cancelled"
+        job["finished_at"] = time.time()
+        if _jobs_by_key.get(job["key"]) == job_id:
+            del _jobs_by_key[job["key"]]
+        return True
+
+
+def forget_job(job_id: str, submitter: str = None):
+    """
+    Drop a finished job once every submitter waiting on it has collected the
+    result (or right away without a submitter).
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        if submitter is not None:
+            job["waiters"].discard(submitter)
+        if submitter is None or not job["waiters"]:
+            _forget(job_id)
+
+
+def list_jobs() -> list:
+    """All known jobs, newest first."""
+    with _jobs_lock:
+        jobs = [dict(job) for job in _jobs.values()]
+    return sorted(jobs, key=lambda job: job["submitted_at"], reverse=True)
@@ -1,8 +1,9 @@
 # llm_evaluation.py
+import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import PyPDF2
 import streamlit as st
 from deepeval.metrics import (
     AnswerRelevancyMetric,
@@ -14,10 +15,182 @@ from deepeval.metrics import (
 from deepeval.test_case import LLMTestCase, LLMTestCaseParams
 from groq import Groq
 
+from src import eval_store
+from src.document_store import document_pages, get_pages
+from src.llm_scheduler import BATCH, INTERACTIVE, chat_completion, scheduled_slot
+from src.llm_telemetry import bind_use_case, record_cache_hit, record_call
+from src.tracing import span, traced
+from src.response_cache import cache_response, cached_response
+
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
+EVALUATION_MODEL = "llama-3.1-8b-instant"
+# Bump when the generation prompt changes so cached answers are not reused
+EVALUATION_PROMPT_VERSION = "evaluation-v1"
+# The judge sees at most this many pages as the full document
+JUDGE_PAGE_LIMIT = 12
+GENERATION_CONTEXT_CHARS = 8000
+DEFAULT_EXPECTED_OUTPUT = "A comprehensive answer based on the document."
+# Lower is better for these metrics
+INVERTED_METRICS = ("Hallucination", "Bias")
+# Threads a batch evaluation uses for answer generation
+BATCH_EVAL_WORKERS = int(os.getenv("BATCH_EVAL_WORKERS", "8"))
+# Metrics a batch evaluation scores at once; each one makes several judge calls
+BATCH_EVAL_METRIC_WORKERS = int(os.getenv("BATCH_EVAL_METRIC_WORKERS", "2"))
+
+
+def _split_pages(page_texts):
+    """(pages the answer is generated from, pages the judge sees as the full document)."""
+    chunks_for_llm = [text for text in page_texts if text]
+    full_document_pages = [text for text in page_texts[:JUDGE_PAGE_LIMIT] if text]
+    return chunks_for_llm, full_document_pages
+
+
+def _generate_answer(question, chunks, doc_hash, priority=INTERACTIVE):
+    """Answer question from the document pages and cache the answer."""
+    context_for_generation = "\n\n".join(chunks)[:GENERATION_CONTEXT_CHARS]
+    response = chat_completion(
+        groq_client,
+        "groq",
+        priority=priority,
+        model=EVALUATION_MODEL,
+        temperature=0.3,
+        max_tokens=500,  # Increased from 400
+        messages=[
+            {
+                "role": "system",
+                "content": f"Answer based solely on this document:\n\n{context_for_generation}",
+            },
+            {"role": "user", "content": question},
+        ],
+    )
+    answer = response.choices[0].message.content
+    cache_response(doc_hash, EVALUATION_MODEL, EVALUATION_PROMPT_VERSION, question, answer)
+    return answer
+
+
+def _build_metrics(with_correctness=False, async_mode=True):
+    """Fresh (name, metric) pairs; DeepEval metrics keep their last score, so one set per test case."""
+    # Define G-Eval Clarity metric
+    clarity_metric = GEval(
+        name="Clarity",
+        evaluation_steps=[
+            "Evaluate whether the response uses clear and direct language",
+            "Check if technical terms are explained appropriately",
+            "Assess whether the structure is logical and easy to follow",
+            "Identify any confusing parts that reduce understanding",
+        ],
+        evaluation_params=[LLMTestCaseParams.ACTUAL_OUTPUT],
+        threshold=0.7,
+        async_mode=async_mode,
+    )
+
+    # DeepEval metrics with ContextualRelevancyMetric instead of Faithfulness
+    metrics_list = [
+        (
+            "Answer Relevancy",
+            AnswerRelevancyMetric(threshold=0.7, include_reason=True, async_mode=async_mode),
+        ),
+        (
+            "Contextual Relevancy",
+            ContextualRelevancyMetric(threshold=0.7, include_reason=True, async_mode=async_mode),
+        ),
+        (
+            "Hallucination",
+            HallucinationMetric(
+                threshold=0.5, include_reason=True, strict_mode=True, async_mode=async_mode
+            ),
+        ),
+        ("Bias", BiasMetric(threshold=0.5, include_reason=True, async_mode=async_mode)),
+        ("Clarity (G-Eval)", clarity_metric),
+    ]
+
+    if with_correctness:
+        correctness_metric = GEval(
+            name="Correctness",
+            evaluation_steps=[
+                "Check whether the facts in the actual output agree with the expected output",
+                "Penalize omitting details the expected output treats as essential",
+                "Do not penalize extra detail that is consistent with the expected output",
+            ],
+            evaluation_params=[
+                LLMTestCaseParams.INPUT,
+                LLMTestCaseParams.ACTUAL_OUTPUT,
+                LLMTestCaseParams.EXPECTED_OUTPUT,
+            ],
+            threshold=0.7,
+            async_mode=async_mode,
+        )
+        metrics_list.append(("Correctness (G-Eval)", correctness_metric))
+
+    return metrics_list
+
+
+def _measure_metric(name, metric, test_case, priority=INTERACTIVE) -> dict:
+    """
+    Score one metric; returns its score, reason, pass/fail and seconds taken.
+
+    A score already stored for the same question, answer, context, metric
+    definition and judge model is returned (with "cached": True) instead of
+    calling the judge again. Otherwise the measurement holds a scheduler slot
+    at the given priority, since DeepEval calls the judge on the shared key.
+    """
+    key = eval_store.result_key(test_case, name, metric)
+    stored = eval_store.get_result(key)
+    if stored is not None:
+        record_cache_hit("eval_result", key[-1])
+        return {**stored, "cached": True}
+
+    # DeepEval calls its judge model itself, so time it here
+    started = time.monotonic()
+    try:
+        try:
+            with scheduled_slot("openai", key[-1], priority), span(f"metric {name}"):
+                metric.measure(test_case)
+        finally:
+            record_call(
+                "openai",
+                str(getattr(metric, "evaluation_model", None) or "deepeval"),
+                f"metric:{name}",
+                time.monotonic() - started,
+                status="ok" if getattr(metric, "score", None) is not None else "error",
+                estimated=True,
+                cost=getattr(metric, "evaluation_cost", None) or 0.0,
+            )
+        result = {
+            "score": round(metric.score, 3),
+            "reason": getattr(metric, "reason", "N/A"),
+            "passed": metric.is_successful(),
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        eval_store.save_result(key, result)
+        return {**result, "cached": False}
+    except Exception as e:
+        error_msg = str(e)[:200]
+        return {
+            "score": 0.0,
+            "reason": f"Evaluation error: {error_msg}",
+            "passed": False,
+            "seconds": round(time.monotonic() - started, 2),
+            "error": True,
+        }
+
+
+def _overall_score(results) -> float:
+    """Mean of the metric scores, inverted for Hallucination/Bias; failed metrics count as 0."""
+    overall_score = 0
+    for name, data in results.items():
+        if data.get("error"):
+            continue
+        if name in INVERTED_METRICS:
+            overall_score += 1 - data["score"]
+        else:
+            overall_score += data["score"]
+    return round(overall_score / len(results), 3) if results else 0.0
+
 
 # ---------- Main agent ----------
+@traced("llm_evaluation_agent")
 def llm_evaluation_agent(user_input, knowledge_base=None):
     if not user_input:
         return """
@@ -39,74 +212,47 @@ def llm_evaluation_agent(user_input, knowledge_base=None):
         return "⚠️ Please upload a policy document first."
 
     try:
-        knowledge_base.seek(0)
-        pdf_reader = PyPDF2.PdfReader(knowledge_base)
-        total_pages = len(pdf_reader.pages)
-
-        # Extract MORE pages for LLM generation (up to 7 pages or all if less)
-        llm_page_count = total_pages
-        chunks_for_llm = []
-        for page_num in range(llm_page_count):
-            text = pdf_reader.pages[page_num].extract_text() or ""
-            if text:
-                chunks_for_llm.append(text)
-
-        # Extract FULL document for judge evaluation (up to 12 pages)
-        full_document_pages = []
-        knowledge_base.seek(0)
-        pdf_reader_full = PyPDF2.PdfReader(knowledge_base)
-        judge_page_count = min(12, total_pages)
-        for page_num in range(judge_page_count):
-            text = pdf_reader_full.pages[page_num].extract_text() or ""
-            if text:
-                full_document_pages.append(text)
-
-        # Store both versions
-        st.session_state["full_document_pages"] = full_document_pages
-        st.session_state["llm_page_count"] = llm_page_count
-        st.session_state["judge_page_count"] = judge_page_count
+        # Pages come from the shared document store: parsed once per document,
+        # and the session only keeps the document id
+        doc_hash, page_texts = document_pages(knowledge_base)
+        chunks_for_llm, _ = _split_pages(page_texts)
+
+        st.session_state["llm_page_count"] = len(page_texts)
+        st.session_state["judge_page_count"] = min(JUDGE_PAGE_LIMIT, len(page_texts))
 
     except Exception as e:
         return f"⚠️ Could not read PDF: {str(e)}"
 
-    # Generate response using EXPANDED context (7 pages)
-    context_for_generation = "\n\n".join(chunks_for_llm)[:8000]  # Increased from 3000
-
-    with st.spinner("Generating response from document..."):
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=500,  # Increased from 400
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"Answer based solely on this document:\n\n{context_for_generation}",
-                },
-                {"role": "user", "content": user_input},
-            ],
-        )
-
-    llm_response = response.choices[0].message.content
+    llm_response = cached_response(
+        doc_hash, EVALUATION_MODEL, EVALUATION_PROMPT_VERSION, user_input
+    )
+    if llm_response is None:
+        with st.spinner("Generating response from document..."):
+            llm_response = _generate_answer(user_input, chunks_for_llm, doc_hash)
 
     # Store for evaluation
     st.session_state["last_query"] = user_input
-    st.session_state["last_chunks_used"] = chunks_for_llm
+    st.session_state["last_document"] = doc_hash
     st.session_state["last_answer"] = llm_response
 
     return llm_response
 
 
 # ---------- DeepEval Evaluation with Full Document Context + G-Eval Clarity ----------
-def evaluate_last_response():
+@traced("evaluate_last_response")
+def evaluate_last_response(knowledge_base=None):
     if "last_answer" not in st.session_state:
         return "⚠️ No response to evaluate yet."
 
     query = st.session_state["last_query"]
     answer = st.session_state["last_answer"]
-    chunks_used_by_llm = st.session_state["last_chunks_used"]
-    full_document_pages = st.session_state.get(
-        "full_document_pages", chunks_used_by_llm
-    )
+    page_texts = get_pages(st.session_state.get("last_document"))
+    if page_texts is None:
+        # Evicted from the document store; re-add it from the upload
+        if knowledge_base is None:
+            return "⚠️ The document is no longer loaded. Please ask the question again."
+        page_texts = document_pages(knowledge_base)[1]
+    chunks_used_by_llm, full_document_pages = _split_pages(page_texts)
     llm_page_count = st.session_state.get("llm_page_count", 3)
     judge_page_count = st.session_state.get("judge_page_count", 10)
 
@@ -134,66 +280,22 @@ def evaluate_last_response():
     test_case = LLMTestCase(
         input=query,
         actual_output=answer,
-        expected_output="A comprehensive answer based on the document.",
+        expected_output=DEFAULT_EXPECTED_OUTPUT,
         retrieval_context=chunks_used_by_llm,  # What LLM saw (7 pages)
         context=full_document_pages,  # What judge sees (12 pages)
     )
 
-    # Define G-Eval Clarity metric
-    clarity_metric = GEval(
-        name="Clarity",
-        evaluation_steps=[
-            "Evaluate whether the response uses clear and direct language",
-            "Check if technical terms are explained appropriately",
-            "Assess whether the structure is logical and easy to follow",
-            "Identify any confusing parts that reduce understanding",
-        ],
-        evaluation_params=[LLMTestCaseParams.ACTUAL_OUTPUT],
-        threshold=0.7,
-    )
-
-    # DeepEval metrics with ContextualRelevancyMetric instead of Faithfulness
-    metrics_list = [
-        ("Answer Relevancy", AnswerRelevancyMetric(threshold=0.7, include_reason=True)),
-        (
-            "Contextual Relevancy",
-            ContextualRelevancyMetric(threshold=0.7, include_reason=True),
-        ),
-        (
-            "Hallucination",
-            HallucinationMetric(threshold=0.5, include_reason=True, strict_mode=True),
-        ),
-        ("Bias", BiasMetric(threshold=0.5, include_reason=True)),
-        ("Clarity (G-Eval)", clarity_metric),
-    ]
-
+    metrics_list = _build_metrics()
     results = {}
-    overall_score = 0
     total_metrics = len(metrics_list)
 
     for idx, (name, metric) in enumerate(metrics_list, 1):
-        try:
-            with status3:
-                st.write(f"Evaluating {name}... ({idx}/{total_metrics})")
-
-            metric.measure(test_case)
-
-            score = round(metric.score, 3)
-            reason = getattr(metric, "reason", "N/A")
+        with status3:
+            st.write(f"Evaluating {name}... ({idx}/{total_metrics})")
+        results[name] = _measure_metric(name, metric, test_case)
 
-            results[name] = {"score": score, "reason": reason}
-
-            # Calculate overall
-            if name in ["Hallucination", "Bias"]:
-                overall_score += 1 - score
-            else:
-                overall_score += score
-
-        except Exception as e:
-            error_msg = str(e)[:200]
-            results[name] = {"score": 0.0, "reason": f"Evaluation error: {error_msg}"}
-
-    overall_score = round(overall_score / total_metrics, 3)
+    overall_score = _overall_score(results)
+    reused = sum(bool(data.get("cached")) for data in results.values())
     status3.update(label="Evaluation ✅", state="complete", expanded=False)
 
     # Build HTML
@@ -224,7 +326,7 @@ def evaluate_last_response():
         score = data["score"]
         reason = str(data["reason"])
 
-        if name in ["Hallucination", "Bias"]:
+        if name in INVERTED_METRICS:
             sc = "#4CAF50" if score <= 0.3 else "#FFC107" if score <= 0.5 else "#FF5722"
         else:
             sc = "#4CAF50" if score >= 0.7 else "#FFC107" if score >= 0.5 else "#FF5722"
@@ -247,8 +349,212 @@ def evaluate_last_response():
 <p style='margin-top: 20px; font-size: 0.9em; color: #666;'>
     <em>Evaluated using DeepEval framework with OpenAI GPT-4o-mini</em><br>
     <em>LLM used {llm_page_count} pages, Judge evaluated against {judge_page_count} pages</em><br>
+    <em>{reused} of {total_metrics} scores reused from earlier evaluations of this answer</em><br>
 </p>
 </div>
 """
 
     return html
+
+
+# ---------- Batch evaluation over a question set ----------
+def load_question_set(file) -> list:
+    """
+    Questions from an uploaded CSV or JSON file.
+
+    CSV needs a `question` column and may have `expected_answer`; JSON is a
+    list of such objects or of plain question strings. Returns a list of
+    {"question", "expected_answer"} dicts (expected_answer may be "").
+    """
+    import pandas as pd
+
+    file.seek(0)
+    if file.name.lower().endswith(".json"):
+        records = json.load(file)
+        if not isinstance(records, list):
+            raise ValueError("The JSON question set must be a list.")
+        records = [r if isinstance(r, dict) else {"question": r} for r in records]
+    else:
+        df = pd.read_csv(file, dtype=str).fillna("")
+        df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+        if "question" not in df.columns:
+            raise ValueError("The CSV question set needs a 'question' column.")
+        records = df.to_dict("records")
+
+    cases = []
+    for record in records:
+        question = str(record.get("question") or "").strip()
+        if question:
+            expected = record.get("expected_answer") or record.get("expected_output") or ""
+            cases.append({"question": question, "expected_answer": str(expected).strip()})
+    if not cases:
+        raise ValueError("The question set has no questions.")
+    return cases
+
+
+@traced("batch_evaluation")
+def run_batch_evaluation(document, cases):
+    """
+    Answer and score every case of a question set against one policy document.
+
+    The PDF is parsed once. Answers are generated concurrently at batch
+    priority through the shared scheduler (cached answers are reused), and
+    each answer's DeepEval metrics are scored as soon as it arrives, at most
+    BATCH_EVAL_METRIC_WORKERS at a time and also at batch priority. Cases with an expected answer are also graded for Correctness.
+    Scores already in the eval store (src/eval_store.py) are reused, so a
+    re-run only pays for new answers and changed metrics. Returns {"rows": [...], "summary": {...}}.
+    """
+    started = time.perf_counter()
+    with span("pdf.extract"):
+        doc_hash, page_texts = document_pages(document)
+    parse_seconds = time.perf_counter() - started
+    chunks_for_llm, full_document_pages = _split_pages(page_texts)
+
+    def answer(case):
+        answer_started = time.perf_counter()
+        try:
+            text = cached_response(
+                doc_hash, EVALUATION_MODEL, EVALUATION_PROMPT_VERSION, case["question"]
+            )
+            if text is None:
+                text = _generate_answer(case["question"], chunks_for_llm, doc_hash, priority=BATCH)
+            error = None
+        except Exception as e:
+            text, error = "", str(e)[:200]
+        return text, time.perf_counter() - answer_started, error
+
+    rows = [
+        {
+            "#": i,
+            "question": case["question"],
+            "expected_answer": case.get("expected_answer", ""),
+            "answer": "",
+            "answer_seconds": 0.0,
+            "error": "",
+        }
+        for i, case in enumerate(cases, 1)
+    ]
+    results = [{} for _ in cases]
+    metric_futures = {}
+    metric_names = []
+
+    with ThreadPoolExecutor(BATCH_EVAL_WORKERS, thread_name_prefix="batch-answer") as answer_pool, \
+            ThreadPoolExecutor(BATCH_EVAL_METRIC_WORKERS, thread_name_prefix="batch-metric") as metric_pool:
+        answer_futures = {
+            answer_pool.submit(bind_use_case(answer), case): i for i, case in enumerate(cases)
+        }
+        for future in as_completed(answer_futures):
+            i = answer_futures[future]
+            text, seconds, error = future.result()
+            rows[i].update(answer=text, answer_seconds=round(seconds, 2), error=error or "")
+            if error:
+                continue
+            expected = rows[i]["expected_answer"]
+            test_case = LLMTestCase(
+                input=rows[i]["question"],
+                actual_output=text,
+                expected_output=expected or DEFAULT_EXPECTED_OUTPUT,
+                retrieval_context=chunks_for_llm,
+                context=full_document_pages,
+            )
+            # The metrics already run on pool threads, so DeepEval's own async mode is off
+            for name, metric in _build_metrics(with_correctness=bool(expected), async_mode=False):
+                metric_future = metric_pool.submit(
+                    bind_use_case(_measure_metric), name, metric, test_case, BATCH
+                )
+                metric_futures[metric_future] = (i, name)
+                if name not in metric_names:
+                    metric_names.append(name)
+
+        for future in as_completed(metric_futures):
+            i, name = metric_futures[future]
+            results[i][name] = future.result()
+
+    for row, case_results in zip(rows, results):
+        for name in metric_names:
+            data = case_results.get(name)
+            row[name] = data["score"] if data else None
+            row[f"{name} reason"] = data["reason"] if data else ""
+        row["overall"] = _overall_score(case_results) if case_results else None
+        row["passed"] = bool(case_results) and all(d["passed"] for d in case_results.values())
+        row["metric_seconds"] = round(
+            sum(d["seconds"] for d in case_results.values() if not d.get("cached")), 2
+        )
+        row["reused_scores"] = sum(bool(d.get("cached")) for d in case_results.values())
+
+    answered = [row for row in rows if not row["error"]]
+    metrics_summary = {}
+    for name in metric_names:
+        scored = [case_results[name] for case_results in results if name in case_results]
+        ok = [d for d in scored if not d.get("error")]
+        metrics_summary[name] = {
+            "cases": len(scored),
+            "mean_score": round(sum(d["score"] for d in ok) / len(ok), 3) if ok else None,
+            "pass_rate": round(sum(d["passed"] for d in scored) / len(scored), 3) if scored else None,
+            "errors": len(scored) - len(ok),
+            "reused": sum(bool(d.get("cached")) for d in scored),
+            "mean_seconds": round(sum(d["seconds"] for d in scored) / len(scored), 2) if scored else None,
+        }
+    overall = [row["overall"] for row in rows if row["overall"] is not None]
+    summary = {
+        "cases": len(rows),
+        "answered": len(answered),
+        "passed": sum(row["passed"] for row in rows),
+        "scored": sum(len(case_results) for case_results in results),
+        "reused_scores": sum(row["reused_scores"] for row in rows),
+        "overall_mean": round(sum(overall) / len(overall), 3) if overall else None,
+        "metrics": metrics_summary,
+        "parse_seconds": round(parse_seconds, 2),
+        "mean_answer_seconds": (
+            round(sum(row["answer_seconds"] for row in answered) / len(answered), 2)
+            if answered else None
+        ),
+        "total_seconds": round(time.perf_counter() - started, 2),
+        "judge_page_count": len(full_document_pages),
+        "llm_page_count": len(page_texts),
+    }
+    return {"rows": rows, "summary": summary}
+
+
+def render_batch_results(results):
+    """Aggregate scores, per-metric summary, per-question table and a CSV download."""
+    import pandas as pd
+
+    summary = results["summary"]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Questions", summary["cases"])
+    c2.metric("Answered", summary["answered"])
+    c3.metric("Passed all metrics", summary["passed"])
+    c4.metric(
+        "Mean overall score",
+        "-" if summary["overall_mean"] is None else f"{summary['overall_mean']:.3f}",
+    )
+    st.caption(
+        f"PDF loaded in {summary['parse_seconds']:.1f}s · "
+        f"mean answer time {summary['mean_answer_seconds'] or 0:.1f}s · "
+        f"total {summary['total_seconds']:.1f}s · {summary['reused_scores']} of "
+        f"{summary['scored']} metric scores reused from earlier runs · "
+        f"LLM used {summary['llm_page_count']} pages, "
+        f"Judge evaluated against {summary['judge_page_count']} pages"
+    )
+
+    st.markdown("**Per metric**")
+    st.dataframe(
+        pd.DataFrame(
+            [{"metric": name, **data} for name, data in summary["metrics"].items()]
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    df = pd.DataFrame(results["rows"])
+    st.markdown("**Per question**")
+    table_columns = [c for c in df.columns if not c.endswith(" reason") and c != "expected_answer"]
+    st.dataframe(df[table_columns], use_container_width=True, hide_index=True)
+    st.download_button(
+        "⬇️ Download results (.csv)",
+        df.to_csv(index=False).encode("utf-8"),
+        file_name="batch_evaluation_results.csv",
+        mime="text/csv",
+        key="download_batch_eval",
+    )
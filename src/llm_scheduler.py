@@ -0,0 +1,377 @@
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from groq import APIConnectionError as GroqConnectionError
+from openai import APIConnectionError as OpenAIConnectionError
+
+from src.llm_telemetry import record_call
+from src.tracing import record_span, span
+
+# =====================================================================
+# Shared scheduler for Groq and OpenAI calls
+# =====================================================================
+# Every chat/moderation request goes through schedule_call(), which:
+#   - tracks request/token budgets per (provider, model) from the
+#     x-ratelimit-* response headers,
+#   - holds a request back while the budget is exhausted until the reset time
+#     (interactive requests give up after SCHEDULER_MAX_WAIT_SECONDS),
+#   - honors Retry-After on 429s (and retries 5xx / connection errors),
+#   - caps concurrent requests per provider (a stream holds its slot until
+#     it is consumed or closed), and
+#   - lets interactive work go first: batch work waits while interactive
+#     requests are queued and leaves a reserve of each budget untouched, and
+#   - records latency, tokens and retries of each call in src/llm_telemetry.py
+#     and the queue wait / call time as spans of the current trace.
+# All Streamlit sessions in the process share one scheduler.
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+MAX_CONCURRENCY = {
+    "groq": int(os.getenv("LLM_MAX_CONCURRENCY_GROQ", "8")),
+    "openai": int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "16")),
+}
+# Share of each request/token budget that batch work may not spend.
+BATCH_RESERVE = float(os.getenv("LLM_BATCH_RESERVE", "0.2"))
+# Longest an interactive request waits for budget before failing; a user in
+# front of the page should not sit on a daily limit that resets in hours.
+SCHEDULER_MAX_WAIT_SECONDS = float(os.getenv("SCHEDULER_MAX_WAIT_SECONDS", "60"))
+MAX_ATTEMPTS = 5
+BACKOFF_MIN, BACKOFF_MAX = 2.0, 60.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+_lock = threading.Condition()
+_budgets = {}
+_in_flight = {}
+_waiting = {INTERACTIVE: 0, BATCH: 0}
+_stats = {"calls": 0, "retries": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+
+
+class RateLimitWaitExceeded(RuntimeError):
+    """An interactive request would wait longer than SCHEDULER_MAX_WAIT_SECONDS for budget."""
+
+
+def parse_duration(value) -> float:
+    """Seconds in a rate-limit reset header such as "1m30.5s", "250ms" or "12"."""
+    if value is None:
+        return 0.0
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    return sum(float(n) * DURATION_UNITS[unit] for n, unit in DURATION_PATTERN.findall(value))
+
+
+def estimate_tokens(kwargs) -> int:
+    """Rough prompt + completion size of a request (about four characters per token)."""
+    chars = 0
+    for message in kwargs.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        chars += len(content) if isinstance(content, str) else 0
+    if isinstance(kwargs.get("input"), str):
+        chars += len(kwargs["input"])
+    return chars // 4 + int(kwargs.get("max_tokens") or 0)
+
+
+def _budget(key) -> dict:
+    budget = _budgets.get(key)
+    if budget is None:
+        budget = _budgets[key] = {
+            "limit_requests": None,
+            "limit_tokens": None,
+            "remaining_requests": None,
+            "remaining_tokens": None,
+            "reset_requests_at": 0.0,
+            "reset_tokens_at": 0.0,
+            "blocked_until": 0.0,
+        }
+    return budget
+
+
+def _wait_time(key, priority, tokens, now) -> float:
+    """Seconds this request must still wait; 0 means it may start now."""
+    provider = key[0]
+    budget = _budget(key)
+    wait = max(0.0, budget["blocked_until"] - now)
+
+    if _in_flight.get(provider, 0) >= MAX_CONCURRENCY.get(provider, 8):
+        wait = max(wait, 0.05)
+    if priority == BATCH and _waiting[INTERACTIVE]:
+        wait = max(wait, 0.05)
+
+    reserve = BATCH_RESERVE if priority == BATCH else 0.0
+    for kind, needed in (("requests", 1), ("tokens", tokens)):
+        remaining = budget[f"remaining_{kind}"]
+        reset_at = budget[f"reset_{kind}_at"]
+        if remaining is None or reset_at <= now:
+            continue
+        floor = reserve * (budget[f"limit_{kind}"] or 0)
+        if remaining - needed < floor:
+            wait = max(wait, reset_at - now)
+    return wait
+
+
+def _acquire(key, priority, tokens):
+    started = time.monotonic()
+    with _lock:
+        _waiting[priority] += 1
+        try:
+            while True:
+                now = time.time()
+                wait = _wait_time(key, priority, tokens, now)
+                if wait <= 0:
+                    break
+                waited = time.monotonic() - started
+                if priority == INTERACTIVE and waited + wait > SCHEDULER_MAX_WAIT_SECONDS:
+                    _stats["throttled_seconds"] += waited
+                    raise RateLimitWaitExceeded(
+                        f"{key[0]} {key[1]} is over its rate limit (next slot in about "
+                        f"{wait:.0f}s). Please try again later."
+                    )
+                _lock.wait(timeout=min(wait, 1.0))
+        finally:
+            _waiting[priority] -= 1
+
+        provider = key[0]
+        _in_flight[provider] = _in_flight.get(provider, 0) + 1
+        # Spend the budget locally so concurrent callers don't all pass on stale headers
+        budget = _budget(key)
+        if budget["remaining_requests"] is not None:
+            budget["remaining_requests"] -= 1
+        if budget["remaining_tokens"] is not None:
+            budget["remaining_tokens"] -= tokens
+        _stats["throttled_seconds"] += time.monotonic() - started
+
+
+def _release(key, headers=None):
+    with _lock:
+        _in_flight[key[0]] -= 1
+        if headers is not None:
+            _update_budget(key, headers)
+        _lock.notify_all()
+
+
+def _update_budget(key, headers):
+    budget = _budget(key)
+    now = time.time()
+    for kind in ("requests", "tokens"):
+        limit = headers.get(f"x-ratelimit-limit-{kind}")
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = headers.get(f"x-ratelimit-reset-{kind}")
+        if limit is not None:
+            budget[f"limit_{kind}"] = int(float(limit))
+        if remaining is not None:
+            budget[f"remaining_{kind}"] = int(float(remaining))
+        if reset is not None:
+            budget[f"reset_{kind}_at"] = now + parse_duration(reset)
+
+
+def _retry_delay(error, attempt) -> float:
+    """Delay before the next attempt: Retry-After when given, else jittered backoff."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    if headers.get("retry-after"):
+        return parse_duration(headers["retry-after"])
+    delay = min(BACKOFF_MAX, BACKOFF_MIN * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _is_retryable(error) -> bool:
+    if isinstance(error, (GroqConnectionError, OpenAIConnectionError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def _usage_tokens(usage):
+    """(prompt, completion) tokens from a usage object, or None if there is none."""
+    if usage is None:
+        return None
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def _record_result(provider, model, endpoint, started, retries, kwargs, result):
+    tokens = _usage_tokens(getattr(result, "usage", None))
+    estimated = tokens is None
+    if estimated:
+        tokens = (estimate_tokens({**kwargs, "max_tokens": 0}), 0)
+    latency = time.perf_counter() - started
+    record_call(provider, model, endpoint, latency, ttft=latency, prompt_tokens=tokens[0],
+                completion_tokens=tokens[1], retries=retries, estimated=estimated)
+
+
+def _release_once(key):
+    """A release callback that frees the slot only on its first call."""
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            _release(key)
+
+    return release
+
+
+def _measure_stream(stream, provider, model, endpoint, started, retries, kwargs, release):
+    """
+    Pass stream chunks through, recording time to first token and usage at the
+    end, and release the request's concurrency slot when the stream ends.
+    """
+    ttft = None
+    usage = None
+    chars = 0
+    status = "error"
+    try:
+        for chunk in stream:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            # OpenAI reports usage on the last chunk, Groq under x_groq
+            usage = (
+                getattr(chunk, "usage", None)
+                or getattr(getattr(chunk, "x_groq", None), "usage", None)
+                or usage
+            )
+            for choice in getattr(chunk, "choices", None) or []:
+                chars += len(getattr(choice.delta, "content", None) or "")
+            yield chunk
+        status = "ok"
+    finally:
+        release()
+        tokens = _usage_tokens(usage)
+        estimated = tokens is None
+        if estimated:
+            tokens = (estimate_tokens({**kwargs, "max_tokens": 0}), chars // 4)
+        record_call(provider, model, endpoint, time.perf_counter() - started, ttft=ttft,
+                    prompt_tokens=tokens[0], completion_tokens=tokens[1],
+                    retries=retries, status=status, estimated=estimated)
+        record_span(f"llm.stream {model}", started, error=None if status == "ok" else status)
+
+
+def schedule_call(provider, model, raw_create, priority=INTERACTIVE,
+                  max_attempts=MAX_ATTEMPTS, endpoint="chat", **kwargs):
+    """
+    Run one API request under the provider's budget and return the parsed result.
+
+    raw_create is the SDK's with_raw_response.create for the endpoint, e.g.
+    client.chat.completions.with_raw_response.create, so rate-limit headers can
+    be read. The last error is re-raised once max_attempts is used up. With
+    stream=True the result is a generator over the SDK stream's chunks. An
+    interactive request raises RateLimitWaitExceeded instead of waiting more
+    than SCHEDULER_MAX_WAIT_SECONDS for budget.
+    """
+    key = (provider, model)
+    tokens = estimate_tokens(kwargs)
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        with span("llm.wait", provider=provider):
+            try:
+                _acquire(key, priority, tokens)
+            except RateLimitWaitExceeded:
+                record_call(provider, model, endpoint, time.perf_counter() - started,
+                            retries=attempt - 1, status="error")
+                raise
+        try:
+            with span(f"llm.{endpoint} {model}", attempt=attempt):
+                raw = raw_create(model=model, **kwargs)
+        except Exception as e:
+            _release(key)
+            if not _is_retryable(e) or attempt >= max_attempts:
+                record_call(provider, model, endpoint, time.perf_counter() - started,
+                            retries=attempt - 1, status="error")
+                raise
+            delay = _retry_delay(e, attempt)
+            with _lock:
+                _stats["retries"] += 1
+                if getattr(e, "status_code", None) == 429:
+                    _stats["rate_limited"] += 1
+                    # Hold every caller of this model, not just this one
+                    _budget(key)["blocked_until"] = max(
+                        _budget(key)["blocked_until"], time.time() + delay
+                    )
+            print(f"{provider} {model} request failed ({e}); retrying in {delay:.1f}s")
+            if getattr(e, "status_code", None) != 429:
+                time.sleep(delay)
+            continue
+
+        with _lock:
+            _stats["calls"] += 1
+        if kwargs.get("stream"):
+            # The slot stays taken while the response is still streaming
+            with _lock:
+                _update_budget(key, raw.headers)
+            release = _release_once(key)
+            chunks = _measure_stream(
+                raw.parse(), provider, model, endpoint, started, attempt - 1, kwargs, release
+            )
+            # A stream that is dropped without being read still frees its slot
+            weakref.finalize(chunks, release)
+            return chunks
+        _release(key, raw.headers)
+        result = raw.parse()
+        _record_result(provider, model, endpoint, started, attempt - 1, kwargs, result)
+        return result
+
+
+@contextmanager
+def scheduled_slot(provider, model, priority=INTERACTIVE, tokens=0):
+    """
+    Hold a request slot for work that calls a provider outside the scheduler,
+    such as DeepEval's judge: the block starts only once a scheduled request
+    with this priority could, and counts as one request in flight until it ends.
+    """
+    key = (provider, model)
+    with span("llm.wait", provider=provider):
+        _acquire(key, priority, tokens)
+    try:
+        yield
+    finally:
+        _release(key)
+
+
+def chat_completion(client, provider, priority=INTERACTIVE, **kwargs):
+    """Scheduled client.chat.completions.create (works with stream=True too)."""
+    # Retries are handled here, so the SDK's own retry loop is switched off
+    client = client.with_options(max_retries=0)
+    return schedule_call(
+        provider,
+        kwargs.pop("model"),
+        client.chat.completions.with_raw_response.create,
+        priority=priority,
+        **kwargs,
+    )
+
+
+def moderation(client, priority=INTERACTIVE, max_attempts=1, **kwargs):
+    """Scheduled OpenAI client.moderations.create; fails fast by default."""
+    client = client.with_options(max_retries=0)
+    return schedule_call(
+        "openai",
+        kwargs.pop("model"),
+        client.moderations.with_raw_response.create,
+        priority=priority,
+        max_attempts=max_attempts,
+        endpoint="moderation",
+        **kwargs,
+    )
+
+
+def get_scheduler_stats() -> dict:
+    """Counters plus the last known budget per (provider, model)."""
+    with _lock:
+        return {
+            **_stats,
+            "in_flight": dict(_in_flight),
+            "budgets": {f"{p}/{m}": dict(b) for (p, m), b in _budgets.items()},
+        }
@@ -0,0 +1,244 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# =====================================================================
+# LLM call telemetry
+# =====================================================================
+# One event per model call (chat, moderation, assistant run) and per cache hit,
+# tagged with the use case that caused it. Events are kept in memory for the
+# "LLM Telemetry" admin page and, when LLM_TELEMETRY_PATH is set, appended to
+# that file as JSON lines.
+
+TELEMETRY_PATH = os.getenv("LLM_TELEMETRY_PATH", "")
+TELEMETRY_BUFFER_SIZE = int(os.getenv("LLM_TELEMETRY_BUFFER", "5000"))
+
+# USD per million (prompt, completion) tokens, for rough cost estimates only.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "omni-moderation-latest": (0.0, 0.0),
+}
+
+_use_case = contextvars.ContextVar("llm_use_case", default="unknown")
+_events = deque(maxlen=TELEMETRY_BUFFER_SIZE)
+_events_lock = threading.Lock()
+
+
+@contextmanager
+def use_case(name: str):
+    """Tag every LLM call made inside the block with name."""
+    token = _use_case.set(name)
+    try:
+        yield
+    finally:
+        _use_case.reset(token)
+
+
+def set_use_case(name: str):
+    """Tag the rest of the current Streamlit script run with name."""
+    _use_case.set(name)
+
+
+def current_use_case() -> str:
+    return _use_case.get()
+
+
+def bind_use_case(fn):
+    """Wrap fn so it keeps the caller's use case (and open trace) on a worker thread."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A fresh copy per call, since one context cannot be entered by two threads
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _emit(event: dict):
+    event = {"ts": round(time.time(), 3), "use_case": current_use_case(), **event}
+    with _events_lock:
+        _events.append(event)
+        if TELEMETRY_PATH:
+            try:
+                with open(TELEMETRY_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event) + "\n")
+            except OSError as e:
+                print(f"Could not write LLM telemetry to {TELEMETRY_PATH}: {e}")
+
+
+def record_call(provider, model, endpoint, latency, ttft=None, prompt_tokens=0,
+                completion_tokens=0, retries=0, status="ok", estimated=False, cost=None):
+    """
+    Record one finished model call. Token counts are estimated when the API gives
+    none; cost defaults to an estimate from MODEL_PRICES.
+    """
+    if cost is None:
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    _emit(
+        {
+            "kind": "call",
+            "provider": provider,
+            "model": model,
+            "endpoint": endpoint,
+            "latency_s": round(latency, 3),
+            "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+            "cost_usd": round(cost, 6),
+            "retries": retries,
+            "status": status,
+        }
+    )
+
+
+def record_cache_hit(cache: str, model: str = None):
+    """Record a request answered from one of the in-process caches."""
+    _emit({"kind": "cache_hit", "cache": cache, "model": model})
+
+
+def get_events() -> list:
+    with _events_lock:
+        return list(_events)
+
+
+def export_jsonl() -> str:
+    return "".join(json.dumps(event) + "\n" for event in get_events())
+
+
+def clear_events():
+    with _events_lock:
+        _events.clear()
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def summarize_events(events=None) -> list:
+    """Per (use case, model) rows: calls, errors, tokens, cost, latency percentiles, cache hits."""
+    events = get_events() if events is None else events
+    groups = {}
+    for event in events:
+        key = (event["use_case"], event.get("model") or "-")
+        row = groups.setdefault(
+            key,
+            {
+                "use_case": key[0],
+                "model": key[1],
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "cache_hits": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+                "_latency": [],
+                "_ttft": [],
+            },
+        )
+        if event["kind"] == "cache_hit":
+            row["cache_hits"] += 1
+            continue
+        row["calls"] += 1
+        row["errors"] += event["status"] != "ok"
+        row["retries"] += event["retries"]
+        row["prompt_tokens"] += event["prompt_tokens"]
+        row["completion_tokens"] += event["completion_tokens"]
+        row["cost_usd"] += event["cost_usd"]
+        row["_latency"].append(event["latency_s"])
+        if event["ttft_s"] is not None:
+            row["_ttft"].append(event["ttft_s"])
+
+    rows = []
+    for row in groups.values():
+        latency, ttft = row.pop("_latency"), row.pop("_ttft")
+        row["p50_latency_s"] = _percentile(latency, 50)
+        row["p95_latency_s"] = _percentile(latency, 95)
+        row["p50_ttft_s"] = _percentile(ttft, 50)
+        row["cost_usd"] = round(row["cost_usd"], 6)
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["cost_usd"], reverse=True)
+
+
+def llm_telemetry_ui():
+    import pandas as pd
+    import streamlit as st
+
+    from src import eval_store
+    from src.document_store import get_document_store_stats
+    from src.llm_scheduler import get_scheduler_stats
+    from src.response_cache import get_response_cache_stats
+
+    col1, col2, col3 = st.columns([1, 7, 1])
+    with col2:
+        st.subheader("LLM Telemetry")
+        events = get_events()
+        calls = [e for e in events if e["kind"] == "call"]
+        if not events:
+            st.info("No LLM calls recorded in this process yet.")
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Calls", len(calls))
+        m2.metric("Cache hits", len(events) - len(calls))
+        m3.metric(
+            "Tokens",
+            f"{sum(e['prompt_tokens'] + e['completion_tokens'] for e in calls):,}",
+        )
+        m4.metric("Est. cost", f"${sum(e['cost_usd'] for e in calls):.4f}")
+
+        if events:
+            st.markdown("#### By use case and model")
+            st.dataframe(pd.DataFrame(summarize_events(events)), use_container_width=True)
+
+            with st.expander("Recent calls"):
+                st.dataframe(pd.DataFrame(events[-200:][::-1]), use_container_width=True)
+
+            st.download_button(
+                "Download JSONL",
+                data=export_jsonl(),
+                file_name="llm_telemetry.jsonl",
+                mime="application/jsonl",
+            )
+
+        st.markdown("#### Rate-limit scheduler")
+        st.json(get_scheduler_stats(), expanded=False)
+        st.markdown("#### Response cache")
+        st.json(get_response_cache_stats(), expanded=False)
+        st.markdown("#### Document store")
+        st.json(get_document_store_stats(), expanded=False)
+
+        st.markdown("#### Stored evaluation scores")
+        counts = eval_store.result_counts()
+        if counts:
+            e1, e2 = st.columns([3, 1])
+            metric = e1.selectbox(
+                "Metric", ["All metrics"] + list(counts), key="eval_store_metric"
+            )
+            if e2.button("Clear stored scores", key="eval_store_clear"):
+                if eval_store.clear_results(None if metric == "All metrics" else metric):
+                    st.success(f"Cleared stored scores: {metric}")
+                else:
+                    st.error("Could not clear the stored scores.")
+                counts = eval_store.result_counts()
+        if counts:
+            st.json({"total": sum(counts.values()), "by_metric": counts}, expanded=False)
+        else:
+            st.caption("No DeepEval scores stored.")
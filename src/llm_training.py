@@ -40,6 +40,8 @@ def llm_finetuning_agent(user_input, training_file=None):
         import pandas as pd
         from groq import Groq
 
+        from src.llm_scheduler import chat_completion
+
         client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
 
         # Generate sample data
@@ -145,7 +147,9 @@ def llm_finetuning_agent(user_input, training_file=None):
                         ]
                     )
                     # ---------  START NEW  ---------
-                    response = client.chat.completions.create(
+                    response = chat_completion(
+                        client,
+                        "groq",
                         model="llama-3.1-8b-instant",
                         temperature=0.3,
                         max_tokens=500,
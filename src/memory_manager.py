@@ -5,6 +5,8 @@ import datetime as dt
 from typing import List, Dict
 from openai import OpenAI
 
+from src.llm_scheduler import chat_completion
+
 MEMORY_FILE = os.path.join(os.path.dirname(__file__), 'memory_db.json')
 BACKUP_DIR = os.path.join(os.path.dirname(__file__), 'memory_backups')
 
@@ -115,7 +117,9 @@ Return exactly valid JSON matching this structure:
 }
 """
     
-    response = client.chat.completions.create(
+    response = chat_completion(
+        client,
+        "openai",
         model="gpt-4o",
         response_format={"type": "json_object"},
         messages=[
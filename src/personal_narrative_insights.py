@@ -1,81 +1,199 @@
 import os
+import threading
 import time
+from contextlib import ExitStack
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from src.llm_telemetry import record_call
+
 load_dotenv()
 
 
-def personal_narrative_insights(user_input):
+# ----- Per-session assistant threads -----
+# Follow-up questions in a chat session are appended to the same Assistants
+# thread, so earlier turns and file-search results are not sent again. Threads
+# idle longer than THREAD_IDLE_TIMEOUT are deleted on the OpenAI side.
+THREAD_IDLE_TIMEOUT = float(os.getenv("NARRATIVE_THREAD_IDLE_TIMEOUT", "1800"))
+THREAD_SWEEP_INTERVAL = 60
+
+_session_threads = {}
+_session_threads_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def _delete_threads(client, thread_ids):
+    for thread_id in thread_ids:
+        try:
+            client.beta.threads.delete(thread_id)
+        except Exception as e:
+            print(f"Could not delete assistant thread {thread_id}: {e}")
+
+
+def cleanup_idle_threads(client=None, force=False):
+    """Forget and delete threads whose session has been idle past the timeout."""
+    global _last_sweep
+    now = time.time()
+    with _session_threads_lock:
+        if not force and now - _last_sweep < THREAD_SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+        expired = [
+            session_id
+            for session_id, entry in _session_threads.items()
+            if now - entry["last_used"] > THREAD_IDLE_TIMEOUT
+        ]
+        thread_ids = [_session_threads.pop(session_id)["thread_id"] for session_id in expired]
+
+    if thread_ids:
+        client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        threading.Thread(target=_delete_threads, args=(client, thread_ids), daemon=True).start()
+
+
+def _get_session_thread(session_id):
+    with _session_threads_lock:
+        entry = _session_threads.get(session_id)
+        if entry is None or time.time() - entry["last_used"] > THREAD_IDLE_TIMEOUT:
+            return None
+        return entry["thread_id"]
+
+
+def _remember_session_thread(session_id, thread_id):
+    with _session_threads_lock:
+        _session_threads[session_id] = {"thread_id": thread_id, "last_used": time.time()}
+
+
+def reset_session_thread(session_id):
+    """Start the next question in a session on a fresh thread (e.g. chat reset)."""
+    with _session_threads_lock:
+        entry = _session_threads.pop(session_id, None)
+    if entry:
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        threading.Thread(
+            target=_delete_threads, args=(client, [entry["thread_id"]]), daemon=True
+        ).start()
+
+
+def _open_run_stream(client, assistant_id, thread_id, user_input):
     """
-    Uses OpenAI Assistant API to generate personal narrative insights.
-    
+    Streamed run on an existing thread, or on a new one when thread_id is None.
+    The request is only sent when the returned manager is entered.
+    """
+    if thread_id is None:
+        return client.beta.threads.create_and_run_stream(
+            assistant_id=assistant_id,
+            thread={"messages": [{"role": "user", "content": user_input}]},
+        )
+    client.beta.threads.messages.create(thread_id=thread_id, role="user", content=user_input)
+    return client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=assistant_id)
+
+
+def _record_run(run, started, ttft):
+    """Telemetry for one assistant run; runs report usage once they finish."""
+    usage = getattr(run, "usage", None)
+    record_call(
+        "openai",
+        getattr(run, "model", None) or "assistant",
+        "assistant",
+        time.monotonic() - started,
+        ttft=ttft,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        status="ok" if run is not None and run.status == "completed" else "error",
+        estimated=usage is None,
+    )
+
+
+def personal_narrative_insights_stream(user_input, session_id=None):
+    """
+    Streams the Personal Narrative Insights assistant's answer as it is written.
+
+    The thread is created and the run started in one streamed request, so text
+    arrives as soon as the model produces it instead of after a polling loop.
+    With a session_id, follow-ups reuse that session's thread.
+
     Args:
         user_input: The user's input/question
-        knowledge_base: Optional knowledge base file (currently not used but kept for compatibility)
-    
-    Returns:
-        str: The assistant's response
+        session_id: Optional chat session key for thread reuse
+
+    Yields:
+        str: Chunks of the assistant's response
     """
     # Initialize OpenAI client
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
+
     # Assistant ID
     assistant_id = os.getenv("CALTRANS_PERSONAL_NARRATIVE_INSIGHTS_ASSISTANT_ID")
-    
+
+    cleanup_idle_threads(client)
+    thread_id = _get_session_thread(session_id) if session_id else None
+    started = time.monotonic()
+    ttft = None
+
     try:
-        # Create a thread
-        thread = client.beta.threads.create()
-        
-        # Add user message to the thread
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=user_input
-        )
-        
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant_id
-        )
-        
-        # Poll for completion
-        while run.status in ["queued", "in_progress", "cancelling"]:
-            time.sleep(0.5)
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-        
-        # Check if run completed successfully
-        if run.status == "completed":
-            # Retrieve messages from the thread
-            messages = client.beta.threads.messages.list(thread_id=thread.id)
-            
-            # Get the assistant's response (first message in the list is the latest)
-            for message in messages.data:
-                if message.role == "assistant":
-                    # Extract text content from the message
-                    if message.content:
-                        if isinstance(message.content, list):
-                            # Handle list of content blocks
-                            text_parts = []
-                            for content_block in message.content:
-                                if hasattr(content_block, 'text') and hasattr(content_block.text, 'value'):
-                                    text_parts.append(content_block.text.value)
-                            return "\n".join(text_parts) if text_parts else "No response generated."
-                        elif hasattr(message.content, 'text') and hasattr(message.content.text, 'value'):
-                            return message.content.text.value
-                    return "No response content found."
-            
-            return "No assistant response found in thread."
-        else:
-            # Handle error states
+        produced_text = False
+        with ExitStack() as stack:
+            try:
+                stream = stack.enter_context(
+                    _open_run_stream(client, assistant_id, thread_id, user_input)
+                )
+            except Exception as e:
+                if thread_id is None:
+                    raise
+                # The saved thread is gone or busy; carry on in a new one.
+                print(f"Reusing assistant thread {thread_id} failed: {e}")
+                # Drop it like an evicted thread, so it does not linger server-side
+                threading.Thread(
+                    target=_delete_threads, args=(client, [thread_id]), daemon=True
+                ).start()
+                stream = stack.enter_context(
+                    _open_run_stream(client, assistant_id, None, user_input)
+                )
+
+            for event in stream:
+                if event.event == "thread.run.created" and session_id:
+                    # Remember the thread right away, so an interrupted run's
+                    # thread is still reused or swept
+                    _remember_session_thread(session_id, event.data.thread_id)
+                elif event.event == "thread.message.delta":
+                    for block in event.data.delta.content or []:
+                        text = block.text.value if block.type == "text" and block.text else None
+                        if text:
+                            if ttft is None:
+                                ttft = time.monotonic() - started
+                            produced_text = True
+                            yield text
+            run = stream.current_run
+
+        _record_run(run, started, ttft)
+
+        if session_id and run is not None:
+            _remember_session_thread(session_id, run.thread_id)
+
+        # Handle error states
+        if run is not None and run.status != "completed":
             error_msg = f"Run failed with status: {run.status}"
-            if hasattr(run, 'last_error') and run.last_error:
+            if getattr(run, "last_error", None):
                 error_msg += f" - {run.last_error.message}"
-            return error_msg
-            
+            yield f"\n\n{error_msg}" if produced_text else error_msg
+        elif not produced_text:
+            yield "No response generated."
+
     except Exception as e:
-        return f"Error calling assistant: {str(e)}"
\ No newline at end of file
+        record_call("openai", "assistant", "assistant", time.monotonic() - started,
+                    ttft=ttft, status="error")
+        yield f"Error calling assistant: {str(e)}"
+
+
+def personal_narrative_insights(user_input, session_id=None):
+    """
+    Uses OpenAI Assistant API to generate personal narrative insights.
+
+    Args:
+        user_input: The user's input/question
+        session_id: Optional chat session key for thread reuse
+
+    Returns:
+        str: The assistant's response
+    """
+    return "".join(personal_narrative_insights_stream(user_input, session_id))
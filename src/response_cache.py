@@ -0,0 +1,190 @@
+import hashlib
+import os
+import re
+import threading
+
+from src.llm_telemetry import record_cache_hit
+from src.ttl_cache import TTLCache
+
+# =====================================================================
+# Response cache for document Q&A
+# =====================================================================
+# Analysts ask the same questions against the same uploaded plan set. Answers
+# are cached per (document hash, model, prompt version) and looked up by the
+# question: first exactly (after normalization), then by word overlap with
+# earlier questions on the same document. Bumping an agent's prompt version
+# invalidates its old answers.
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+# Jaccard overlap of content words a different wording must exceed to reuse an answer.
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.8"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "about", "can", "could", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "of", "on", "please", "tell", "that", "the",
+    "there", "this", "to", "was", "were", "what", "which", "with", "you",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9#]+")
+# Words that flip or bound what a question asks ("minimum" vs "maximum", "are
+# required" vs "are not required"); like identifiers they must match exactly.
+POLARITY_WORDS = (
+    "not", "no", "none", "never", "without", "except", "nor", "cannot", "t",
+    "isn", "aren", "doesn", "don", "didn", "wasn", "won", "shouldn",
+    "min", "max", "minimum", "maximum", "least", "most", "before", "after",
+    "increase", "increased", "increases", "increasing",
+    "decrease", "decreased", "decreases", "decreasing",
+    "above", "below", "over", "under", "more", "less", "fewer",
+    "greater", "higher", "lower", "larger", "smaller", "earlier", "later",
+)
+
+
+def document_hash(document) -> str:
+    """
+    Content hash used to key cached answers to an uploaded document.
+
+    Accepts raw bytes, a file path, or a file-like object such as a Streamlit
+    UploadedFile (which is rewound afterwards).
+    """
+    if isinstance(document, str):
+        with open(document, "rb") as f:
+            data = f.read()
+    elif isinstance(document, bytes):
+        data = document
+    else:
+        document.seek(0)
+        data = document.read()
+        document.seek(0)
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(TOKEN_PATTERN.findall(question.lower()))
+
+
+def _has_digit(token: str) -> bool:
+    return any(ch.isdigit() for ch in token)
+
+
+def _stem(token: str) -> str:
+    # Crude suffix stripping so "changed" / "changes" / "changing" compare equal
+    if len(token) > 4 and not _has_digit(token):
+        for suffix in ("ing", "ed", "es", "s"):
+            if token.endswith(suffix):
+                return token[: -len(suffix)]
+    return token
+
+
+POLARITY_TERMS = frozenset(_stem(word) for word in POLARITY_WORDS)
+
+
+def _is_exact_term(term: str) -> bool:
+    return _has_digit(term) or term in POLARITY_TERMS
+
+
+def question_terms(question: str) -> frozenset:
+    return frozenset(
+        _stem(token)
+        for token in TOKEN_PATTERN.findall(question.lower())
+        if token not in STOPWORDS
+    )
+
+
+def similarity(terms_a: frozenset, terms_b: frozenset) -> float:
+    """
+    Jaccard overlap of two questions' content words.
+
+    Identifiers such as plan numbers, years and bar sizes must match exactly:
+    "Plan A76A in 2024" and "Plan A76B in 2024" are different questions. So
+    must negations and comparative terms: "minimum footing thickness" and
+    "maximum footing thickness" are different questions too.
+    """
+    if not terms_a or not terms_b:
+        return 0.0
+    if {t for t in terms_a if _is_exact_term(t)} != {t for t in terms_b if _is_exact_term(t)}:
+        return 0.0
+    return len(terms_a & terms_b) / len(terms_a | terms_b)
+
+
+class ResponseCache:
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 threshold=RESPONSE_CACHE_SIMILARITY):
+        self.threshold = threshold
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._counts = {"exact": 0, "similar": 0, "miss": 0}
+
+    def _count(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def lookup(self, doc_hash, model, prompt_version, question):
+        """Cached answer for this question (or a near-duplicate), else None."""
+        namespace = (doc_hash, model, prompt_version)
+        entry = self._entries.get((namespace, normalize_question(question)))
+        if entry is not None:
+            self._count("exact")
+            return entry["answer"]
+
+        terms = question_terms(question)
+        best, best_score = None, self.threshold
+        for (entry_namespace, _), entry in self._entries.items():
+            if entry_namespace != namespace:
+                continue
+            score = similarity(terms, entry["terms"])
+            if score > best_score:
+                best, best_score = entry, score
+        if best is not None:
+            self._count("similar")
+            return best["answer"]
+
+        self._count("miss")
+        return None
+
+    def store(self, doc_hash, model, prompt_version, question, answer):
+        namespace = (doc_hash, model, prompt_version)
+        self._entries.set(
+            (namespace, normalize_question(question)),
+            {"terms": question_terms(question), "answer": answer},
+        )
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._counts = {"exact": 0, "similar": 0, "miss": 0}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = sum(counts.values())
+        hits = counts["exact"] + counts["similar"]
+        return {
+            "exact_hits": counts["exact"],
+            "similar_hits": counts["similar"],
+            "misses": counts["miss"],
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "size": len(self._entries.items()),
+        }
+
+
+# One cache shared by every agent and session in the process
+response_cache = ResponseCache()
+
+
+def cached_response(doc_hash, model, prompt_version, question):
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    answer = response_cache.lookup(doc_hash, model, prompt_version, question)
+    if answer is not None:
+        record_cache_hit("response", model)
+    return answer
+
+
+def cache_response(doc_hash, model, prompt_version, question, answer):
+    if RESPONSE_CACHE_ENABLED and answer:
+        response_cache.store(doc_hash, model, prompt_version, question, answer)
+
+
+def get_response_cache_stats() -> dict:
+    return response_cache.stats()
@@ -0,0 +1,209 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# =====================================================================
+# Per-request timing spans
+# =====================================================================
+# With TRACING_ENABLED=true, app.py starts a trace for every script run and
+# the hot paths wrap their stages in span("name"). Spans opened on worker
+# threads (jobs, guardrails, the judge) land in the trace that submitted
+# them. When tracing is off, span() hands back one shared no-op context
+# manager and @traced leaves functions untouched.
+#
+# TRACE_PROFILE=true additionally samples the Python stack of each top-level
+# span, so the debug panel can show which functions the time went to.
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+PROFILING_ENABLED = TRACING_ENABLED and os.getenv("TRACE_PROFILE", "false").lower() == "true"
+PROFILE_INTERVAL = float(os.getenv("TRACE_PROFILE_INTERVAL", "0.005"))
+PROFILE_TOP_N = 25
+
+_NOOP = nullcontext()
+_current_trace = contextvars.ContextVar("trace", default=None)
+_depth = contextvars.ContextVar("trace_depth", default=0)
+
+
+def start_trace(name: str):
+    """Begin a new trace for this request; returns it, or None when tracing is off."""
+    if not TRACING_ENABLED:
+        return None
+    trace = {
+        "name": name,
+        "started_at": time.time(),
+        "_t0": time.perf_counter(),
+        "spans": [],
+        "profile": Counter(),
+        "_lock": threading.Lock(),
+    }
+    _current_trace.set(trace)
+    _depth.set(0)
+    return trace
+
+
+@contextmanager
+def _span(trace, name, attrs):
+    depth = _depth.get()
+    token = _depth.set(depth + 1)
+    sampler = None
+    if PROFILING_ENABLED and depth == 0:
+        sampler = _Sampler(threading.get_ident())
+        sampler.start()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        ended = time.perf_counter()
+        _depth.reset(token)
+        if sampler is not None:
+            sampler.stop()
+        with trace["_lock"]:
+            trace["spans"].append(
+                {
+                    "name": name,
+                    "depth": depth,
+                    "start_ms": round((started - trace["_t0"]) * 1000, 1),
+                    "duration_ms": round((ended - started) * 1000, 1),
+                    "thread": threading.current_thread().name,
+                    "error": error,
+                    **attrs,
+                }
+            )
+            if sampler is not None:
+                trace["profile"].update(sampler.samples)
+
+
+def span(name: str, **attrs):
+    """
+    Time the enclosed block as one stage of the current trace.
+
+    Extra keyword arguments (page counts, model names) are stored on the span;
+    the yielded dict can be filled in from inside the block as well.
+    """
+    trace = _current_trace.get() if TRACING_ENABLED else None
+    if trace is None:
+        return _NOOP
+    return _span(trace, name, attrs)
+
+
+def record_span(name: str, started: float, **attrs):
+    """
+    Add a span timed by hand from started (a time.perf_counter() value) to now.
+
+    For stages that cannot sit inside a with block, such as a stream consumed
+    across several yields.
+    """
+    trace = _current_trace.get() if TRACING_ENABLED else None
+    if trace is None:
+        return
+    ended = time.perf_counter()
+    with trace["_lock"]:
+        trace["spans"].append(
+            {
+                "name": name,
+                "depth": _depth.get(),
+                "start_ms": round((started - trace["_t0"]) * 1000, 1),
+                "duration_ms": round((ended - started) * 1000, 1),
+                "thread": threading.current_thread().name,
+                "error": attrs.pop("error", None),
+                **attrs,
+            }
+        )
+
+
+def traced(name: str = None):
+    """Decorator form of span(); a no-op when tracing is disabled."""
+
+    def decorate(fn):
+        if not TRACING_ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's stack every PROFILE_INTERVAL seconds (cumulative counts)."""
+
+    def __init__(self, thread_id: int):
+        super().__init__(name="trace-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(PROFILE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                if key not in seen:
+                    seen.add(key)
+                    self.samples[key] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def trace_rows(trace) -> list:
+    """Spans of a trace in start order, with each span's share of the request."""
+    with trace["_lock"]:
+        spans = sorted(trace["spans"], key=lambda s: (s["start_ms"], s["depth"]))
+    total = max((s["start_ms"] + s["duration_ms"] for s in spans), default=0) or 1
+    return [
+        {
+            "stage": " " * s["depth"] + s["name"],
+            "start_ms": s["start_ms"],
+            "duration_ms": s["duration_ms"],
+            "share": f"{s['duration_ms'] / total:.0%}",
+            "thread": s["thread"],
+            "error": s["error"] or "",
+            **{k: v for k, v in s.items() if k not in ("name", "depth", "start_ms", "duration_ms", "thread", "error")},
+        }
+        for s in spans
+    ]
+
+
+def render_trace_panel(traces: list):
+    """Debug panel with the timing breakdown of this session's recent requests."""
+    import pandas as pd
+    import streamlit as st
+
+    traces = [t for t in traces if t["spans"]]
+    with st.expander("⏱️ Timing breakdown (debug)", expanded=False):
+        if not traces:
+            st.caption("No traced stages in this session yet.")
+            return
+        for trace in reversed(traces):
+            rows = trace_rows(trace)
+            total = max(r["start_ms"] + r["duration_ms"] for r in rows)
+            stamp = time.strftime("%H:%M:%S", time.localtime(trace["started_at"]))
+            st.markdown(f"**{trace['name']}** · {stamp} · {total:,.0f} ms")
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+            if trace["profile"]:
+                top = trace["profile"].most_common(PROFILE_TOP_N)
+                st.caption("Sampled stack (cumulative samples per function)")
+                st.dataframe(
+                    pd.DataFrame(top, columns=["function", "samples"]),
+                    use_container_width=True,
+                    hide_index=True,
+                )